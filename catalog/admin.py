@@ -1,37 +1,161 @@
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteMixin, RelatedFieldWidgetWrapper
+from django.core.paginator import Paginator
+from django.forms import BaseInlineFormSet, ModelChoiceField
 
-from .models import Author, Book, BookInstance, Genre, Language, Publisher
+from .models import Author, Book, BookInstance, Genre, Language, OverdueNotice, Publisher
+from .pagination import EstimatedCountPaginator
 
 
-class BookInline(admin.StackedInline):
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """Inline formset editing one page of the related rows.
+
+        Only the rows of the requested page are loaded and posted back, and
+        the choices of the related fields are read once per page instead of
+        once per row. Rows that did not change are not saved"""
+
+    per_page = 20
+    params = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        queryset = self.queryset
+        ordering = list(queryset.query.order_by or self.model._meta.ordering)
+        self.paginator = Paginator(queryset.order_by(*ordering, 'pk'), self.per_page)
+        self.page = self.paginator.get_page(self.params.get(self.page_kwarg))
+        self.queryset = self.page.object_list
+
+        self._choices = {}
+
+    @property
+    def page_kwarg(self):
+        return self.prefix + '-page'
+
+    def page_query(self, number):
+        params = self.params.copy()
+        params[self.page_kwarg] = number
+        return params.urlencode()
+
+    def previous_page_query(self):
+        return self.page_query(self.page.previous_page_number())
+
+    def next_page_query(self):
+        return self.page_query(self.page.next_page_number())
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+
+        # Rows point back at the edited object, don't fetch it again per row
+        if self.instance.pk is not None:
+            self.fk.set_cached_value(form.instance, self.instance)
+
+        for name, field in form.fields.items():
+            widget = field.widget
+            if isinstance(widget, RelatedFieldWidgetWrapper):
+                widget = widget.widget
+
+            # Skip the hidden primary key field, whose choices are the rows
+            if (not isinstance(field, ModelChoiceField) or widget.is_hidden
+                    or isinstance(widget, AutocompleteMixin)):
+                continue
+
+            if name not in self._choices:
+                self._choices[name] = list(field.choices)
+
+            field.choices = widget.choices = self._choices[name]
+
+        return form
+
+
+class PaginatedInlineMixin:
+    """Page an inline with PaginatedInlineFormSet, ``?<prefix>-page=N``
+        selects the page"""
+
+    formset = PaginatedInlineFormSet
+    per_page = 20
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.per_page = self.per_page
+        formset.params = request.GET
+        return formset
+
+
+class BookInline(PaginatedInlineMixin, admin.StackedInline):
     model = Book
     extra = 1
+    show_change_link = True
+    template = 'admin/catalog/edit_inline/paginated_stacked.html'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('genre')
 
 
 @admin.register(Author)
 class AuthorAdmin(admin.ModelAdmin):
     list_display = ('last_name', 'first_name',
                     'date_of_birth', 'date_of_death')
+    search_fields = ('last_name', 'first_name')
 
     fields = ['first_name', 'last_name', ('date_of_birth', 'date_of_death')]
     inlines = [BookInline]
 
 
-class BookInstanceInline(admin.TabularInline):
+class BookInstanceInline(PaginatedInlineMixin, admin.TabularInline):
     model = BookInstance
     extra = 0
+    show_change_link = True
+    template = 'admin/catalog/edit_inline/paginated_tabular.html'
+
+    # Loans are edited on the copy's own page, the inline only shows the
+    # borrower, already joined to the page query
+    fields = ('imprint', 'status', 'due_back', 'borrower')
+    readonly_fields = ('borrower',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('borrower')
 
 
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
     list_display = ('title', 'author', 'display_genre')
+    list_select_related = ('author',)
+    search_fields = ('title', 'isbn')
+    autocomplete_fields = ('author',)
     inlines = [BookInstanceInline]
 
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('genre')
+
+
+class OverdueListFilter(admin.SimpleListFilter):
+    title = 'overdue'
+    parameter_name = 'overdue'
+
+    def lookups(self, request, model_admin):
+        return (('yes', 'Yes'),)
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.overdue()
+
+        return queryset
+
 
 @admin.register(BookInstance)
 class BookInstanceAdmin(admin.ModelAdmin):
-    list_display = ('id', 'book', 'borrower', 'due_back', 'status')
-    list_filter = ('status', 'due_back')
+    list_display = ('id', 'book', 'borrower',
+                    'due_back', 'status', 'overdue')
+    list_filter = ('status', OverdueListFilter, 'due_back')
+    list_select_related = ('book', 'borrower')
+    autocomplete_fields = ('book', 'borrower')
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     fieldsets = (
         (None, {
@@ -42,6 +166,13 @@ class BookInstanceAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate_overdue()
+
+    @admin.display(boolean=True, ordering='overdue')
+    def overdue(self, obj):
+        return obj.overdue
+
 
 @admin.register(Genre)
 class GenreAdmin(admin.ModelAdmin):
@@ -56,3 +187,10 @@ class LanguageAdmin(admin.ModelAdmin):
 @admin.register(Publisher)
 class PublisherAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(OverdueNotice)
+class OverdueNoticeAdmin(admin.ModelAdmin):
+    list_display = ('bookinstance', 'borrower', 'due_back', 'sent_at')
+    list_select_related = ('bookinstance__book', 'borrower')
+    raw_id_fields = ('bookinstance', 'borrower')
@@ -0,0 +1,351 @@
+"""Read-only JSON API over the catalog.
+
+Rows are read with ``.values()`` limited to the fields asked for with
+``?fields=``, and serialized as they come, without model instances. Lists
+are paged by cursor: follow ``next`` and ``previous`` until they are null.
+Batches of books and copies are looked up by ISBN or id in one request.
+"""
+import json
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from .models import Author, Book, BookInstance, Genre, Publisher
+from .pagination import CursorPaginator, InvalidCursor
+
+
+class ApiError(Exception):
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class ResourceView(View):
+    """JSON list and detail endpoint of one model.
+
+        ``fields`` maps the API field names to the lookups they are read
+        from, None for fields computed by an ``add_<name>`` method for the
+        whole page at once. ``filters`` maps query parameters to lookups"""
+
+    model = None
+    fields = {}
+    filters = {}
+    ordering = ('pk',)
+    per_page = 50
+    max_per_page = 200
+    use_replica = True
+
+    def get(self, request, pk=None):
+        try:
+            fields = self.get_fields()
+            if pk is None:
+                data = self.get_list(fields)
+            else:
+                data = self.get_detail(pk, fields)
+        except ApiError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+
+        return JsonResponse(data, encoder=DjangoJSONEncoder,
+                            json_dumps_params={'separators': (',', ':')})
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+    def get_fields(self):
+        requested = self.request.GET.get('fields')
+        if not requested:
+            return list(self.fields)
+
+        fields = list(dict.fromkeys(
+            name.strip() for name in requested.split(',') if name.strip()))
+        unknown = [name for name in fields if name not in self.fields]
+        if unknown:
+            raise ApiError('Unknown fields: %s' % ', '.join(unknown))
+
+        return fields
+
+    def get_values(self, queryset, fields, extra=()):
+        names, expressions = [], {}
+        for name in fields:
+            lookup = self.fields[name]
+            if lookup == name:
+                names.append(name)
+            elif lookup is not None:
+                expressions[name] = F(lookup)
+
+        names += [name for name in extra if name not in names]
+        return queryset.values(*names, **expressions)
+
+    def serialize(self, rows, fields):
+        for name in fields:
+            if self.fields[name] is None:
+                getattr(self, 'add_' + name)(rows)
+
+        return [{name: row[name] for name in fields} for row in rows]
+
+    def filter_queryset(self, queryset):
+        for param, lookup in self.filters.items():
+            value = self.request.GET.get(param)
+            if value is None:
+                continue
+
+            try:
+                queryset = queryset.filter(**{lookup: value})
+            except (ValueError, ValidationError):
+                raise ApiError('Invalid %s: %s' % (param, value))
+
+        return queryset
+
+    def get_per_page(self):
+        try:
+            per_page = int(self.request.GET.get('limit', self.per_page))
+        except ValueError:
+            raise ApiError('Invalid limit')
+
+        if per_page < 1:
+            raise ApiError('Invalid limit')
+
+        return min(per_page, self.max_per_page)
+
+    def get_list(self, fields):
+        ordering = [name.lstrip('-') for name in self.ordering]
+        queryset = self.get_values(
+            self.filter_queryset(self.get_queryset()), fields, extra=['pk'] + ordering)
+
+        paginator = CursorPaginator(queryset, self.get_per_page(), self.ordering)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor as e:
+            raise ApiError(str(e))
+
+        return {
+            'results': self.serialize(page.object_list, fields),
+            'next': self.page_url(page.next_cursor),
+            'previous': self.page_url(page.previous_cursor),
+        }
+
+    def get_detail(self, pk, fields):
+        rows = list(self.get_values(self.get_queryset().filter(pk=pk), fields, extra=['pk']))
+        if not rows:
+            raise ApiError('Not found', status=404)
+
+        return self.serialize(rows, fields)[0]
+
+    def page_url(self, cursor):
+        if cursor is None:
+            return None
+
+        params = self.request.GET.copy()
+        params['cursor'] = cursor
+        return self.request.build_absolute_uri('?' + params.urlencode())
+
+
+class BookResource(ResourceView):
+    model = Book
+    fields = {
+        'id': 'id',
+        'title': 'title',
+        'isbn': 'isbn',
+        'summary': 'summary',
+        'number_of_pages': 'number_of_pages',
+        'author_id': 'author_id',
+        'language_name': 'language__name',
+        'genres': None,
+        'updated_at': 'updated_at',
+    }
+    filters = {'author': 'author_id', 'genre': 'genre'}
+    ordering = ('title', 'pk')
+
+    def add_genres(self, rows):
+        genres = {}
+        for book_id, name in Book.genre.through.objects.filter(
+                book_id__in=[row['pk'] for row in rows]).order_by(
+                    'genre__name').values_list('book_id', 'genre__name'):
+            genres.setdefault(book_id, []).append(name)
+
+        for row in rows:
+            row['genres'] = genres.get(row['pk'], [])
+
+
+class AuthorResource(ResourceView):
+    model = Author
+    fields = {
+        'id': 'id',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'date_of_birth': 'date_of_birth',
+        'date_of_death': 'date_of_death',
+    }
+    ordering = ('last_name', 'first_name', 'pk')
+
+
+class GenreResource(ResourceView):
+    model = Genre
+    fields = {'id': 'id', 'name': 'name'}
+    ordering = ('name', 'pk')
+
+
+class PublisherResource(ResourceView):
+    model = Publisher
+    fields = {'id': 'id', 'name': 'name'}
+    ordering = ('name', 'pk')
+
+
+class CopyResource(ResourceView):
+    """Copies and their availability, borrowers are not exposed"""
+
+    model = BookInstance
+    fields = {
+        'id': 'id',
+        'book_id': 'book_id',
+        'imprint_id': 'imprint_id',
+        'status': 'status',
+        'due_back': 'due_back',
+    }
+    filters = {'book': 'book_id', 'status': 'status'}
+    ordering = ('pk',)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class LookupView(View):
+    """Resolve a batch of keys to their items, in the order given.
+
+        Keys are POSTed as a JSON object holding a list under ``key_name``,
+        or passed comma separated in the query string for small batches.
+        They are read with one ``IN`` query per chunk of ``chunk_size``
+        keys. Keys matching nothing get ``{"found": false}``. POST only
+        reads here, so the request may still use a replica"""
+
+    key_name = None
+    use_replica = True
+    read_only_methods = ('POST',)
+
+    def get(self, request):
+        keys = request.GET.get(self.key_name, '')
+        return self.respond([key for key in keys.split(',') if key])
+
+    def post(self, request):
+        try:
+            keys = json.loads(request.body)[self.key_name]
+        except (ValueError, TypeError, KeyError):
+            return JsonResponse(
+                {'error': 'Expected a JSON object with a %s list' % self.key_name},
+                status=400)
+
+        if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+            return JsonResponse(
+                {'error': '%s must be a list of strings' % self.key_name}, status=400)
+
+        return self.respond(keys)
+
+    def respond(self, keys):
+        if len(keys) > settings.API_LOOKUP_MAX_KEYS:
+            return JsonResponse(
+                {'error': 'At most %d keys per request' % settings.API_LOOKUP_MAX_KEYS},
+                status=400)
+
+        # Repeated keys are looked up and answered once
+        keys = list(dict.fromkeys(key.strip() for key in keys))
+        found = {}
+        for chunk in self.chunks([key for key in keys if self.is_valid(key)]):
+            found.update(self.lookup(chunk))
+
+        results = [found.get(key) or self.not_found(key) for key in keys]
+        return JsonResponse({'results': results}, encoder=DjangoJSONEncoder,
+                            json_dumps_params={'separators': (',', ':')})
+
+    def chunks(self, keys):
+        size = settings.API_LOOKUP_CHUNK_SIZE
+        max_params = connections[self.model._default_manager.db].features.max_query_params
+        if max_params:
+            size = min(size, max_params)
+
+        for start in range(0, len(keys), size):
+            yield keys[start:start + size]
+
+    def is_valid(self, key):
+        return bool(key)
+
+    def lookup(self, keys):
+        """Result of each of ``keys`` found, by key"""
+
+        raise NotImplementedError
+
+    def not_found(self, key):
+        return {self.result_key: key, 'found': False}
+
+
+class BookLookup(LookupView):
+    """Books by ISBN, with the status, due date and imprint of their copies"""
+
+    model = Book
+    key_name = 'isbns'
+    result_key = 'isbn'
+
+    def lookup(self, keys):
+        books = {}
+
+        # One row per copy, or a single row without copy for books with none
+        for row in Book.objects.filter(isbn__in=keys).order_by().values_list(
+                'isbn', 'id', 'title', 'bookinstance__id', 'bookinstance__status',
+                'bookinstance__due_back', 'bookinstance__imprint__name'):
+            isbn, book_id, title, copy_id, status, due_back, imprint = row
+
+            book = books.setdefault(isbn, {
+                'isbn': isbn, 'found': True, 'id': book_id, 'title': title,
+                'available': 0, 'copies': [],
+            })
+            if copy_id is None:
+                continue
+
+            book['available'] += status == 'a'
+            book['copies'].append({
+                'id': copy_id, 'status': status, 'due_back': due_back, 'imprint': imprint,
+            })
+
+        return books
+
+
+class CopyLookup(LookupView):
+    """Copies by id, with their status, due date and imprint"""
+
+    model = BookInstance
+    key_name = 'ids'
+    result_key = 'id'
+
+    def is_valid(self, key):
+        try:
+            uuid.UUID(key)
+        except ValueError:
+            return False
+
+        return True
+
+    def lookup(self, keys):
+        # Answer with the ids as they were sent, whatever their case or dashes
+        sent = {}
+        for key in keys:
+            sent.setdefault(uuid.UUID(key), []).append(key)
+
+        copies = {}
+        for copy_id, status, due_back, imprint, book_id, isbn, title in \
+                BookInstance.objects.filter(pk__in=sent).order_by().values_list(
+                    'id', 'status', 'due_back', 'imprint__name',
+                    'book_id', 'book__isbn', 'book__title'):
+            for key in sent[copy_id]:
+                copies[key] = {
+                    'id': key, 'found': True, 'status': status,
+                    'available': status == 'a', 'due_back': due_back, 'imprint': imprint,
+                    'book_id': book_id, 'isbn': isbn, 'title': title,
+                }
+
+        return copies
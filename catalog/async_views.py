@@ -0,0 +1,85 @@
+"""Async versions of the read-only catalog views, served under ASGI.
+
+Django 3.2 has no async ORM, so each view runs whole, template rendering
+included, in a worker thread. The event loop stays free to hold slow
+clients while the threads wait on the database. Sync views served under
+ASGI all share a single thread instead.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from localLibrary import pooling
+
+from . import views
+
+
+def async_view(view):
+    """Async view running the sync ``view`` in a worker thread"""
+
+    def run(request, *args, **kwargs):
+        # Worker threads keep their own connections, recycle them as
+        # request_started and request_finished do for the request thread
+        close_old_connections()
+        pooling.check_connections()
+        try:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+            return response
+        finally:
+            pooling.touch_connections()
+            close_old_connections()
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await sync_to_async(run, thread_sensitive=False)(request, *args, **kwargs)
+
+    return wrapper
+
+
+class AsyncViewMixin:
+    """Serve a class-based view with async_view"""
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = async_view(super().as_view(**initkwargs))
+        view.view_class = cls
+        view.view_initkwargs = initkwargs
+        return view
+
+
+index = async_view(views.index)
+
+
+class BookListView(AsyncViewMixin, views.BookListView):
+    pass
+
+
+class BookDetailView(AsyncViewMixin, views.BookDetailView):
+    pass
+
+
+class AuthorListView(AsyncViewMixin, views.AuthorListView):
+    pass
+
+
+class AuthorDetailView(AsyncViewMixin, views.AuthorDetailView):
+    pass
+
+
+class GenreListView(AsyncViewMixin, views.GenreListView):
+    pass
+
+
+class GenreDetailView(AsyncViewMixin, views.GenreDetailView):
+    pass
+
+
+class PublisherListView(AsyncViewMixin, views.PublisherListView):
+    pass
+
+
+class PublisherDetailView(AsyncViewMixin, views.PublisherDetailView):
+    pass
@@ -0,0 +1,221 @@
+"""Streaming export of the catalog as CSV or JSON lines.
+
+Books are read from a server-side cursor with ``.iterator()``. Their genres
+and per-status copy counts are fetched for a batch of books at a time, so
+memory stays flat however large the catalog is.
+
+Under ASGI the ORM may not run on the event loop, so ExportStream also
+reads the export from a thread of its own, handing chunks back to the loop.
+
+A download holds its worker for as long as the export takes. Exports
+started with start_export are written to the default storage by a
+background thread instead, and downloaded from there once complete.
+"""
+import asyncio
+import contextvars
+import csv
+import itertools
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Book, BookInstance
+
+BATCH_SIZE = 2000
+
+# Chunks joined into each part handed from the export thread to the loop
+CHUNKS_PER_PART = 500
+
+# Directory of the default storage background exports are saved in
+EXPORT_DIR = 'exports'
+
+# Background exports being written, by file name
+running = {}
+lock = threading.Lock()
+
+FIELDS = [
+    'isbn', 'title', 'summary', 'author', 'genres', 'language',
+    'number_of_pages', 'copies_available', 'copies_on_loan',
+    'copies_reserved', 'copies_maintenance',
+]
+
+COPY_FIELDS = {
+    'a': 'copies_available',
+    'o': 'copies_on_loan',
+    'r': 'copies_reserved',
+    'm': 'copies_maintenance',
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def export_rows(batch_size=BATCH_SIZE):
+    books = Book.objects.order_by('pk').values_list(
+        'pk', 'isbn', 'title', 'summary', 'author__first_name',
+        'author__last_name', 'language__name', 'number_of_pages'
+    ).iterator(chunk_size=batch_size)
+
+    while True:
+        batch = list(itertools.islice(books, batch_size))
+        if not batch:
+            return
+
+        book_ids = [book[0] for book in batch]
+
+        genres = {}
+        for book_id, name in Book.genre.through.objects.filter(
+                book_id__in=book_ids).order_by('genre__name').values_list('book_id', 'genre__name'):
+            genres.setdefault(book_id, []).append(name)
+
+        copies = {}
+        for book_id, status, count in BookInstance.objects.filter(
+                book_id__in=book_ids).order_by().values_list('book_id', 'status').annotate(count=Count('pk')):
+            copies[book_id, status] = count
+
+        for pk, isbn, title, summary, first_name, last_name, language, pages in batch:
+            row = {
+                'isbn': isbn,
+                'title': title,
+                'summary': summary,
+                'author': f'{last_name}, {first_name}' if last_name is not None else None,
+                'genres': genres.get(pk, []),
+                'language': language,
+                'number_of_pages': pages,
+            }
+            for status, field in COPY_FIELDS.items():
+                row[field] = copies.get((pk, status), 0)
+
+            yield row
+
+
+class Echo:
+    """File-like object handing back what is written to it"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(FIELDS)
+
+    for row in rows:
+        row['genres'] = '; '.join(row['genres'])
+        yield writer.writerow([row[field] for field in FIELDS])
+
+
+def stream_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+def stream_export(export_format, batch_size=BATCH_SIZE):
+    stream = stream_csv if export_format == 'csv' else stream_jsonl
+    return stream(export_rows(batch_size))
+
+
+class ExportStream:
+    """Export iterable from sync code, as by StreamingHttpResponse under
+        WSGI, and from async code, as by the ASGI handler.
+
+        Async iteration runs the export in a single dedicated thread, so the
+        server-side cursor of ``export_rows`` stays on one connection"""
+
+    def __init__(self, export_format, batch_size=BATCH_SIZE):
+        self.export_format = export_format
+        self.batch_size = batch_size
+
+    def __iter__(self):
+        return stream_export(self.export_format, self.batch_size)
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export')
+        # Run with the request's context, for its query statistics
+        context = contextvars.copy_context()
+
+        def run(func, *args):
+            return loop.run_in_executor(executor, context.run, func, *args)
+
+        chunks = await run(iter, self)
+        try:
+            while True:
+                part = await run(self.next_part, chunks)
+                if not part:
+                    return
+                yield part
+        finally:
+            await run(self.finish, chunks)
+            executor.shutdown(wait=False)
+
+    @staticmethod
+    def next_part(chunks):
+        return ''.join(itertools.islice(chunks, CHUNKS_PER_PART))
+
+    @staticmethod
+    def finish(chunks):
+        chunks.close()
+        # The thread ends with the export, so do its connections
+        connections.close_all()
+
+
+def start_export(export_format):
+    """Write the export to the default storage in a background thread and
+        return the name of the file it will be saved as"""
+
+    name = '%s/books-%s.%s' % (
+        EXPORT_DIR, timezone.now().strftime('%Y%m%d-%H%M%S-%f'), export_format)
+    thread = threading.Thread(
+        target=write_export, args=(export_format, name), name='export', daemon=True)
+
+    with lock:
+        running[name] = thread
+    thread.start()
+
+    return name
+
+
+def write_export(export_format, name, batch_size=BATCH_SIZE):
+    """Save the export as ``name`` in the default storage.
+
+        It is written to a temporary file first and saved once complete, so
+        the files in the storage are whole exports"""
+
+    try:
+        with tempfile.TemporaryFile() as output:
+            for chunk in stream_export(export_format, batch_size):
+                output.write(chunk.encode('utf-8'))
+            output.seek(0)
+            return default_storage.save(name, File(output))
+    finally:
+        with lock:
+            running.pop(name, None)
+        connections.close_all()
+
+
+def running_exports():
+    with lock:
+        return dict(running)
+
+
+def saved_exports():
+    """Names and sizes of the saved exports, newest first"""
+
+    if not default_storage.exists(EXPORT_DIR):
+        return []
+
+    _, files = default_storage.listdir(EXPORT_DIR)
+    return [
+        (name, default_storage.size('%s/%s' % (EXPORT_DIR, name)))
+        for name in sorted(files, reverse=True)
+    ]
@@ -0,0 +1,67 @@
+from django.db import NotSupportedError, models
+
+
+class SearchDocumentField(models.Field):
+    """Document column of the book search index.
+
+        On PostgreSQL it is a tsvector column, on SQLite the FTS5 table
+        itself is matched, so the column is never selected directly"""
+
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return 'tsvector'
+
+        return None
+
+
+def _sqlite_table_column(compiler, col):
+    # FTS5 exposes a hidden column named after the table, qualified by alias
+    return '%s.%s' % (
+        compiler.quote_name_unless_alias(col.alias),
+        compiler.connection.ops.quote_name(col.target.model._meta.db_table)
+    )
+
+
+@SearchDocumentField.register_lookup
+class SearchMatch(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        raise NotSupportedError(
+            'Full-text search is not supported on %s.' % connection.vendor)
+
+    def as_sqlite(self, compiler, connection):
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return '%s MATCH %s' % (_sqlite_table_column(compiler, self.lhs), rhs), rhs_params
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return "%s @@ to_tsquery('english', %s)" % (lhs, rhs), lhs_params + rhs_params
+
+
+class SearchRank(models.Func):
+    """Relevance of a matched document, higher is better"""
+
+    output_field = models.FloatField()
+
+    def __init__(self, document, query):
+        super().__init__(document, models.Value(query))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(
+            'Full-text search is not supported on %s.' % connection.vendor)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # FTS5 ``rank`` is the bm25 score, where lower means more relevant
+        document = self.source_expressions[0]
+        return '-%s.%s' % (
+            compiler.quote_name_unless_alias(document.alias),
+            connection.ops.quote_name('rank')
+        ), []
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        document, query = self.source_expressions
+        document_sql, document_params = compiler.compile(document)
+        query_sql, query_params = compiler.compile(query)
+        return "ts_rank_cd(%s, to_tsquery('english', %s))" % (document_sql, query_sql), document_params + query_params
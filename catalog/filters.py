@@ -1,13 +1,38 @@
 import django_filters
-from .models import Book
+from django import forms
+
+from .models import Book, BookInstance
+from .search import search_books
 
 
 class BookFilter(django_filters.FilterSet):
 
+    q = django_filters.CharFilter(method='search', label='Search')
+
     class Meta:
         model = Book
-        fields = {
-            'title': ['icontains'],
-            'author': ['exact'],
-            'genre': ['exact']
-        }
+        fields = ['author', 'genre']
+
+    def search(self, queryset, name, value):
+        return search_books(queryset, value)
+
+
+class LoanFilter(django_filters.FilterSet):
+
+    overdue = django_filters.BooleanFilter(
+        method='filter_overdue', label='Overdue only', widget=forms.CheckboxInput)
+
+    borrower = django_filters.CharFilter(
+        field_name='borrower__username', label='Borrower')
+
+    due_back = django_filters.DateFromToRangeFilter(label='Due between')
+
+    class Meta:
+        model = BookInstance
+        fields = []
+
+    def filter_overdue(self, queryset, name, value):
+        if value:
+            return queryset.overdue()
+
+        return queryset
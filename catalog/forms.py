@@ -1,4 +1,5 @@
 from django import forms
+from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.utils.translation import ugettext_lazy as _
 
@@ -20,3 +21,30 @@ class RenewBookForm(forms.Form):
                 _('Invalid date - renewal more than 4 weeks ahead'))
 
         return data
+
+
+class CheckoutForm(forms.Form):
+    borrower = forms.CharField(
+        max_length=150, help_text="Username of the reader borrowing the book")
+    due_back = forms.DateField(
+        help_text="Enter a date between Now and 4 weeks (default 3)")
+
+    def clean_borrower(self):
+        data = self.cleaned_data['borrower']
+
+        try:
+            return User.objects.get(username=data)
+        except User.DoesNotExist:
+            raise ValidationError(_('Unknown reader'))
+
+    def clean_due_back(self):
+        data = self.cleaned_data['due_back']
+
+        if (data < datetime.date.today()):
+            raise ValidationError(_('Invalid date - due date in past'))
+
+        if data > datetime.date.today() + datetime.timedelta(weeks=4):
+            raise ValidationError(
+                _('Invalid date - due date more than 4 weeks ahead'))
+
+        return data
@@ -0,0 +1,119 @@
+"""Lending and returning copies.
+
+Each change locks the copy's row in a short transaction holding only the
+lock and the update, so desks working on the same title do not queue
+behind each other. The statistics and page versions are updated once it
+commits. Updates also check the status they expect, which keeps two
+desks from lending the same copy on databases without row locks, such
+as SQLite.
+"""
+import datetime
+from contextlib import nullcontext
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Book, BookInstance, CatalogStatistics, Publisher
+
+LOAN_PERIOD = datetime.timedelta(weeks=3)
+
+
+class LoanError(Exception):
+    pass
+
+
+def default_due_back():
+    return datetime.date.today() + LOAN_PERIOD
+
+
+def lend_any_copy(book_id, borrower, due_back=None, using=None):
+    """Lend an available copy of the book and return its id.
+
+        Copies locked by a concurrent checkout are skipped, so parallel
+        checkouts of one title each get a different copy without waiting"""
+
+    copies = BookInstance.objects.using(using)
+
+    while True:
+        with _locking(copies):
+            copy = copies.select_for_update(skip_locked=True).filter(
+                book_id=book_id, status__exact='a').order_by('pk').values_list(
+                    'pk', 'book_id', 'imprint_id').first()
+
+            if copy is None:
+                raise LoanError('No copy of this book is available')
+
+            if _change(copies, copy[0], 'a', status='o', borrower=borrower,
+                       due_back=due_back or default_due_back()):
+                break
+
+    _changed(copy, available_copies=-1, using=using)
+    return copy[0]
+
+
+def lend_copy(copy_id, borrower, due_back=None, using=None):
+    """Lend the given copy, waiting for a concurrent change of it to end"""
+
+    copies = BookInstance.objects.using(using)
+
+    with _locking(copies):
+        copy = _lock(copies, copy_id)
+
+        if not _change(copies, copy_id, 'a', status='o', borrower=borrower,
+                       due_back=due_back or default_due_back()):
+            raise LoanError('This copy is not available')
+
+    _changed(copy, available_copies=-1, using=using)
+
+
+def return_copy(copy_id, using=None):
+    copies = BookInstance.objects.using(using)
+
+    with _locking(copies):
+        copy = _lock(copies, copy_id)
+
+        if not _change(copies, copy_id, 'o', status='a', borrower=None, due_back=None):
+            raise LoanError('This copy is not on loan')
+
+    _changed(copy, available_copies=1, using=using)
+
+
+def _locking(copies):
+    """Transaction holding the row locks taken on ``copies``.
+
+        Databases without row locks get none: on SQLite a read would only
+        make concurrent changes deadlock on the database lock, and the
+        status check of each update already keeps them apart"""
+
+    db = copies.select_for_update().db
+    if not connections[db].features.has_select_for_update:
+        return nullcontext()
+
+    return transaction.atomic(using=db)
+
+
+def _lock(copies, copy_id):
+    copy = copies.select_for_update().filter(pk=copy_id).values_list(
+        'pk', 'book_id', 'imprint_id').first()
+
+    if copy is None:
+        raise BookInstance.DoesNotExist('No copy %s' % copy_id)
+
+    return copy
+
+
+def _change(copies, copy_id, expected_status, **values):
+    return copies.filter(pk=copy_id, status__exact=expected_status).update(
+        updated_at=timezone.now(), **values)
+
+
+def _changed(copy, using=None, **deltas):
+    # Queryset updates send no signals, do what the BookInstance ones do
+    _, book_id, imprint_id = copy
+    now = timezone.now()
+
+    CatalogStatistics.adjust(**deltas)
+    if book_id is not None:
+        Book.objects.using(using).filter(pk=book_id).update(updated_at=now)
+    if imprint_id is not None:
+        Publisher.objects.using(using).filter(pk=imprint_id).update(updated_at=now)
@@ -0,0 +1,128 @@
+import datetime
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.urls import reverse
+
+from catalog import views
+from catalog.models import Author, Book, BookInstance, Genre, Publisher
+
+LIST_VIEWS = (
+    ('books', views.BookListView),
+    ('authors', views.AuthorListView),
+    ('genres', views.GenreListView),
+    ('publishers', views.PublisherListView),
+    ('my-borrowed', views.LoanedBooksByUser),
+    ('borrowed', views.BorrowedBooksForLibrarian),
+)
+
+
+class Command(BaseCommand):
+    help = ('EXPLAIN the page queries of the catalog list views and fail '
+            'when one of them does not read through an index')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Seed this many books (with authors, genres, publishers and '
+                 'two copies each) in a transaction rolled back afterwards')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            reader = User.objects.order_by('pk').first()
+
+            if options['seed']:
+                reader = self.seed(options['seed'])
+
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+            failures = self.check_views(reader)
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(
+                'No index used by: %s' % ', '.join(failures))
+
+        self.stdout.write(self.style.SUCCESS(
+            'Every list view reads through an index'))
+
+    def seed(self, number_of_books):
+        User.objects.bulk_create(
+            User(username=f'seed-reader-{number}') for number in range(10))
+        readers = list(User.objects.filter(username__startswith='seed-reader-'))
+
+        Author.objects.bulk_create(
+            Author(first_name=f'First {number}', last_name=f'Last {number % 997}')
+            for number in range(number_of_books // 10 + 1))
+        Genre.objects.bulk_create(
+            Genre(name=f'Genre {number}') for number in range(50))
+        Publisher.objects.bulk_create(
+            Publisher(name=f'Publisher {number}') for number in range(100))
+
+        authors = list(Author.objects.values_list('pk', flat=True))
+        publishers = list(Publisher.objects.values_list('pk', flat=True))
+
+        Book.objects.bulk_create((
+            Book(title=f'Title {number * 7919 % number_of_books}',
+                 summary='Seeded', isbn=f'S{number:012}',
+                 author_id=authors[number % len(authors)])
+            for number in range(number_of_books)
+        ), batch_size=1000)
+
+        books = Book.objects.filter(
+            isbn__startswith='S').values_list('pk', flat=True).iterator()
+        today = datetime.date.today()
+
+        BookInstance.objects.bulk_create((
+            BookInstance(
+                book_id=book, imprint_id=publishers[book % len(publishers)],
+                status='o' if copy else 'a',
+                due_back=today + datetime.timedelta(days=book % 60 - 30),
+                borrower=readers[book % len(readers)] if copy else None)
+            for book in books for copy in range(2)
+        ), batch_size=1000)
+
+        return readers[0]
+
+    def check_views(self, reader):
+        factory = RequestFactory()
+        failures = []
+
+        for url_name, view_class in LIST_VIEWS:
+            request = factory.get(reverse(url_name))
+            request.user = reader
+
+            view = view_class()
+            view.setup(request)
+            queryset = view.get_queryset()[:view.paginate_by]
+
+            plan = queryset.explain()
+            uses_index = self.uses_index(plan)
+
+            self.stdout.write('%s %s\n%s\n' % (
+                url_name, 'OK' if uses_index else 'NO INDEX', plan))
+
+            if not uses_index:
+                failures.append(url_name)
+
+        return failures
+
+    def uses_index(self, plan):
+        if connection.vendor == 'sqlite':
+            scans = re.findall(r'SCAN .*', plan)
+            return (
+                'TEMP B-TREE' not in plan
+                and all('USING' in scan for scan in scans)
+            )
+
+        if connection.vendor == 'postgresql':
+            return (
+                'Seq Scan' not in plan
+                and re.search(r'(^|->\s*)Sort\b', plan, re.MULTILINE) is None
+            )
+
+        return 'index' in plan.lower()
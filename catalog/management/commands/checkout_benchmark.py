@@ -0,0 +1,127 @@
+import statistics
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from catalog import loans
+from catalog.models import Book, BookInstance, CatalogStatistics
+
+BENCHMARK_ISBN = 'CHECKOUTBENCH'
+
+
+class Command(BaseCommand):
+    help = ('Lend copies of one title from many threads at once and report '
+            'throughput, latency, lost checkouts and copies lent twice. The '
+            'title, its copies and readers are created in the configured '
+            'database and removed afterwards')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--copies', type=int, default=200,
+            help='Number of copies of the title')
+        parser.add_argument(
+            '--checkouts', type=int, default=250,
+            help='Number of checkouts to attempt, more than --copies to '
+                 'also run out of copies')
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Number of threads lending at once')
+
+    def handle(self, *args, **options):
+        book, readers = self.seed(options['copies'], options['checkouts'])
+
+        try:
+            results = self.run(book, readers, options['checkouts'], options['concurrency'])
+            self.report(book, results, options['copies'])
+        finally:
+            self.clean_up(book)
+
+    def seed(self, number_of_copies, number_of_readers):
+        self.clean_up(Book.objects.filter(isbn=BENCHMARK_ISBN).first())
+
+        book = Book.objects.create(
+            title='Checkout benchmark', summary='Benchmark', isbn=BENCHMARK_ISBN)
+        BookInstance.objects.bulk_create(
+            BookInstance(book=book, status='a') for _ in range(number_of_copies))
+        User.objects.bulk_create(
+            User(username=f'checkout-reader-{number}') for number in range(number_of_readers))
+        CatalogStatistics.rebuild()
+
+        return book, list(User.objects.filter(username__startswith='checkout-reader-'))
+
+    def run(self, book, readers, checkouts, concurrency):
+        remaining = iter(readers[:checkouts])
+        lock = threading.Lock()
+        results = []
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        reader = next(remaining, None)
+                    if reader is None:
+                        return
+
+                    started = time.perf_counter()
+                    try:
+                        loans.lend_any_copy(book.pk, reader)
+                        outcome = 'lent'
+                    except loans.LoanError:
+                        outcome = 'unavailable'
+                    except DatabaseError:
+                        outcome = 'error'
+
+                    with lock:
+                        results.append((outcome, time.perf_counter() - started))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(max(concurrency, 1))]
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.elapsed = time.perf_counter() - started
+
+        return results
+
+    def report(self, book, results, number_of_copies):
+        outcomes = [outcome for outcome, _ in results]
+        durations = sorted(duration * 1000 for _, duration in results)
+
+        copies = BookInstance.objects.filter(book=book)
+        lent = copies.filter(status__exact='o').count()
+        borrowers = copies.filter(status__exact='o').values('borrower').distinct().count()
+
+        self.stdout.write('%s: %d checkouts in %.2fs, %.1f checkouts/s' % (
+            connection.vendor, len(results), self.elapsed,
+            len(results) / max(self.elapsed, 1e-6)))
+        self.stdout.write('latency ms: median %.1f, p95 %.1f, max %.1f' % (
+            statistics.median(durations),
+            durations[min(int(len(durations) * 0.95), len(durations) - 1)],
+            durations[-1]))
+        self.stdout.write('%d lent, %d found no copy, %d failed' % (
+            outcomes.count('lent'), outcomes.count('unavailable'), outcomes.count('error')))
+
+        expected = min(number_of_copies, len(results))
+        if lent != outcomes.count('lent') or borrowers != lent:
+            self.stdout.write(self.style.ERROR(
+                '%d copies on loan to %d readers after %d checkouts' % (
+                    lent, borrowers, outcomes.count('lent'))))
+        elif lent + outcomes.count('error') < expected:
+            self.stdout.write(self.style.ERROR(
+                'Only %d copies lent while %d were available' % (lent, expected)))
+        else:
+            self.stdout.write(self.style.SUCCESS('Every copy lent at most once'))
+
+    def clean_up(self, book):
+        if book is not None:
+            BookInstance.objects.filter(book=book).delete()
+            book.delete()
+        User.objects.filter(username__startswith='checkout-reader-').delete()
+        CatalogStatistics.rebuild()
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from catalog.export import BATCH_SIZE, CONTENT_TYPES, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Stream every book with its author, genres, language and copy counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=sorted(CONTENT_TYPES), default='csv')
+        parser.add_argument(
+            '--output', help='File to write to, standard output by default')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        chunks = stream_export(options['format'], options['batch_size'])
+
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            output.writelines(chunks)
@@ -0,0 +1,254 @@
+import csv
+import itertools
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from catalog import search
+from catalog.models import (Author, Book, BookInstance, CatalogStatistics,
+                            Genre, Language, Publisher)
+from catalog.signals import touch_books
+
+BOOK_FIELDS = ['title', 'summary', 'author', 'language', 'number_of_pages']
+
+
+def fits(model, field_name, *values):
+    """Whether the values fit the max_length of the field. bulk_create does
+        not validate them, and some databases reject a long value, failing
+        the whole batch"""
+
+    max_length = model._meta.get_field(field_name).max_length
+    return all(len(value) <= max_length for value in values if value)
+
+
+class Command(BaseCommand):
+    help = ('Stream books, authors, genres and copies from a CSV or JSONL '
+            'file into the catalog, updating books that share an ISBN')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file to import')
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'],
+            help='Input format, guessed from the file extension by default')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Records written per transaction')
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording the number of imported records, '
+                 'defaults to PATH.checkpoint')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Skip the records recorded in the checkpoint file')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or (
+            'jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+        checkpoint = options['checkpoint'] or path + '.checkpoint'
+        batch_size = options['batch_size']
+
+        skip = self.read_checkpoint(checkpoint) if options['resume'] else 0
+
+        self.load_lookups()
+
+        imported = skipped = 0
+        started = time.monotonic()
+
+        with open(path, newline='', encoding='utf-8') as source:
+            records = self.read_records(source, input_format)
+            records = itertools.islice(records, skip, None)
+
+            while True:
+                batch = list(itertools.islice(records, batch_size))
+                if not batch:
+                    break
+
+                batch_started = time.monotonic()
+                with transaction.atomic():
+                    written = self.import_batch(batch)
+
+                imported += written
+                skipped += len(batch) - written
+                self.write_checkpoint(checkpoint, skip + imported + skipped)
+
+                self.stdout.write('%d records imported, %.0f records/s' % (
+                    skip + imported + skipped,
+                    len(batch) / max(time.monotonic() - batch_started, 1e-6)))
+
+        CatalogStatistics.rebuild()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            'Imported %d books in %.1fs (%.0f books/s), skipped %d invalid or repeated records' % (
+                imported, elapsed, imported / max(elapsed, 1e-6), skipped)))
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+    def read_checkpoint(self, checkpoint):
+        try:
+            with open(checkpoint) as checkpoint_file:
+                return int(checkpoint_file.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+        except ValueError:
+            raise CommandError('Unreadable checkpoint file %s' % checkpoint)
+
+    def write_checkpoint(self, checkpoint, position):
+        with open(checkpoint, 'w') as checkpoint_file:
+            checkpoint_file.write(str(position))
+
+    def read_records(self, source, input_format):
+        if input_format == 'csv':
+            yield from csv.DictReader(source)
+            return
+
+        for line_number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+
+            try:
+                yield json.loads(line)
+            except ValueError:
+                raise CommandError('Invalid JSON on line %d' % line_number)
+
+    def load_lookups(self):
+        self.authors = {
+            (first_name, last_name): pk for pk, first_name, last_name in
+            Author.objects.values_list('pk', 'first_name', 'last_name')
+        }
+        self.genres = dict(Genre.objects.values_list('name', 'pk'))
+        self.languages = dict(Language.objects.values_list('name', 'pk'))
+        self.publishers = dict(Publisher.objects.values_list('name', 'pk'))
+
+    def clean(self, record):
+        isbn = (record.get('isbn') or '').strip()
+        title = (record.get('title') or '').strip()
+        if not isbn or not title:
+            return None
+
+        first_name = (record.get('author_first_name') or '').strip()
+        last_name = (record.get('author_last_name') or '').strip()
+        if not (first_name or last_name) and record.get('author'):
+            last_name, _, first_name = record['author'].partition(',')
+            last_name, first_name = last_name.strip(), first_name.strip()
+
+        genres = record.get('genres') or []
+        if isinstance(genres, str):
+            genres = genres.split(';')
+
+        try:
+            number_of_pages = int(record.get('number_of_pages') or 0) or None
+            copies = int(record.get('copies') or 0)
+        except (TypeError, ValueError):
+            return None
+
+        record = {
+            'isbn': isbn,
+            'title': title,
+            'summary': (record.get('summary') or '').strip(),
+            'author': (first_name, last_name) if first_name or last_name else None,
+            'genres': [name.strip() for name in genres if name.strip()],
+            'language': (record.get('language') or '').strip() or None,
+            'number_of_pages': number_of_pages,
+            'imprint': (record.get('imprint') or '').strip() or None,
+            'copies': copies,
+        }
+
+        if not (fits(Book, 'isbn', isbn)
+                and fits(Book, 'title', title)
+                and fits(Book, 'summary', record['summary'])
+                and fits(Author, 'first_name', first_name)
+                and fits(Author, 'last_name', last_name)
+                and fits(Genre, 'name', *record['genres'])
+                and fits(Language, 'name', record['language'])
+                and fits(Publisher, 'name', record['imprint'])):
+            return None
+
+        return record
+
+    def resolve(self, lookup, model, names, build):
+        """Create the names missing from ``lookup`` and add their pks to it"""
+
+        missing = {name for name in names if name and name not in lookup}
+        if not missing:
+            return
+
+        model.objects.bulk_create(build(name) for name in missing)
+
+        # bulk_create does not return pks on every database, read them back
+        if model is Author:
+            created = Author.objects.filter(
+                last_name__in={last for _, last in missing}
+            ).values_list('pk', 'first_name', 'last_name')
+            lookup.update({(first, last): pk for pk, first, last in created})
+        else:
+            lookup.update(model.objects.filter(
+                name__in=missing).values_list('name', 'pk'))
+
+    def import_batch(self, batch):
+        records = {}
+        for record in map(self.clean, batch):
+            if record is not None:
+                records[record['isbn']] = record
+
+        if not records:
+            return 0
+
+        records = list(records.values())
+
+        self.resolve(self.authors, Author, [record['author'] for record in records],
+                     lambda name: Author(first_name=name[0], last_name=name[1]))
+        self.resolve(self.genres, Genre, itertools.chain.from_iterable(
+            record['genres'] for record in records), lambda name: Genre(name=name))
+        self.resolve(self.languages, Language, [record['language'] for record in records],
+                     lambda name: Language(name=name))
+        self.resolve(self.publishers, Publisher, [record['imprint'] for record in records],
+                     lambda name: Publisher(name=name))
+
+        existing = Book.objects.in_bulk(
+            [record['isbn'] for record in records], field_name='isbn')
+
+        new_books, updated_books = [], []
+        for record in records:
+            book = existing.get(record['isbn']) or Book(isbn=record['isbn'])
+            book.title = record['title']
+            book.summary = record['summary']
+            book.author_id = self.authors.get(record['author'])
+            book.language_id = self.languages.get(record['language'])
+            book.number_of_pages = record['number_of_pages']
+
+            (updated_books if book.pk else new_books).append(book)
+
+        Book.objects.bulk_create(new_books)
+        Book.objects.bulk_update(updated_books, BOOK_FIELDS)
+
+        book_ids = dict(Book.objects.filter(
+            isbn__in=[record['isbn'] for record in records]).values_list('isbn', 'pk'))
+
+        BookGenre = Book.genre.through
+        BookGenre.objects.filter(book_id__in=[book.pk for book in updated_books]).delete()
+        BookGenre.objects.bulk_create(
+            BookGenre(book_id=book_ids[record['isbn']], genre_id=self.genres[name])
+            for record in records for name in set(record['genres']))
+
+        # Copies are only added with a new book, so a resumed or repeated
+        # import does not duplicate them
+        new_isbns = {book.isbn for book in new_books}
+        BookInstance.objects.bulk_create(
+            BookInstance(
+                book_id=book_ids[record['isbn']],
+                imprint_id=self.publishers.get(record['imprint']),
+                status='a')
+            for record in records if record['isbn'] in new_isbns
+            for copy in range(record['copies']))
+
+        # Bulk writes send no signals, update the index and page versions here
+        search.index_books(book_ids.values())
+        touch_books(pk__in=book_ids.values())
+
+        return len(records)
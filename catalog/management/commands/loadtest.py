@@ -0,0 +1,187 @@
+import asyncio
+import contextvars
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from catalog import visits
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+# Under ASGI the statements of a request run in other threads, which see
+# its RequestStats through this variable
+request_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+def record_request_query(execute, sql, params, many, context):
+    stats = request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    return stats(execute, sql, params, many, context)
+
+
+def install_request_recorder(connection, **kwargs):
+    if record_request_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_request_query)
+
+
+class RequestStats:
+    """Execute wrapper counting the statements of one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.writes = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        if sql.lstrip().upper().startswith(WRITE_STATEMENTS):
+            self.writes += 1
+
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = ('Request a page repeatedly through the full middleware stack, in '
+            'process, and report throughput, latency and database work per '
+            'request. Requests run against the configured database')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'url', nargs='?',
+            help='Path to request, the home page by default')
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Number of requests to send')
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Number of threads, or coroutines with --asgi, sending requests')
+        parser.add_argument(
+            '--username',
+            help='Send the requests logged in as this user')
+        parser.add_argument(
+            '--no-cookies', action='store_true',
+            help='Send every request without cookies, like a crawler, '
+                 'instead of keeping them like a returning browser')
+        parser.add_argument(
+            '--asgi', action='store_true',
+            help='Send the requests through the ASGI handler from one event '
+                 'loop. Set ASYNC_VIEWS=True to serve them with the async views')
+
+    def handle(self, *args, **options):
+        self.url = options['url'] or reverse('index')
+        self.user = None
+        self.no_cookies = options['no_cookies']
+
+        if options['username']:
+            self.user = User.objects.filter(username=options['username']).first()
+            if self.user is None:
+                raise CommandError('Unknown user %s' % options['username'])
+
+        self.local = threading.local()
+        self.errors = 0
+
+        requests = options['requests']
+        concurrency = max(options['concurrency'], 1)
+
+        if options['asgi']:
+            connection_created.connect(install_request_recorder)
+            for existing in connections.all():
+                install_request_recorder(existing)
+
+        started = time.perf_counter()
+        if options['asgi']:
+            # Like the single thread of an ASGI server, this one runs the
+            # sync parts of requests
+            results = async_to_sync(self.send_async)(requests, concurrency)
+        elif concurrency == 1:
+            results = [self.send() for _ in range(requests)]
+        else:
+            with ThreadPoolExecutor(concurrency) as executor:
+                results = list(executor.map(lambda _: self.send(), range(requests)))
+        elapsed = time.perf_counter() - started
+
+        visits.counter.flush()
+
+        if options['asgi']:
+            self.stdout.write('ASGI, %s views' % ('async' if settings.ASYNC_VIEWS else 'sync'))
+        else:
+            self.stdout.write('WSGI, %d threads' % concurrency)
+
+        self.report(results, elapsed)
+
+    def client(self):
+        if self.no_cookies or not hasattr(self.local, 'client'):
+            client = Client(raise_request_exception=False)
+            if self.user is not None:
+                client.force_login(self.user)
+            self.local.client = client
+
+        return self.local.client
+
+    def send(self):
+        client = self.client()
+        stats = RequestStats()
+
+        with connection.execute_wrapper(stats):
+            started = time.perf_counter()
+            response = client.get(self.url)
+            duration = time.perf_counter() - started
+
+        return response.status_code, duration, stats.queries, stats.writes
+
+    async def send_async(self, requests, concurrency):
+        remaining = iter(range(requests))
+        results = []
+
+        async def worker():
+            client = None
+            for _ in remaining:
+                if self.no_cookies or client is None:
+                    client = AsyncClient(raise_request_exception=False)
+                    if self.user is not None:
+                        await sync_to_async(client.force_login)(self.user)
+
+                stats = RequestStats()
+                token = request_stats.set(stats)
+                try:
+                    started = time.perf_counter()
+                    response = await client.get(self.url)
+                    duration = time.perf_counter() - started
+                finally:
+                    request_stats.reset(token)
+
+                results.append((response.status_code, duration, stats.queries, stats.writes))
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return results
+
+    def report(self, results, elapsed):
+        statuses = [status for status, _, _, _ in results]
+        durations = sorted(duration * 1000 for _, duration, _, _ in results)
+        errors = sum(status >= 400 for status in statuses)
+
+        def per_request(index):
+            return sum(result[index] for result in results) / len(results)
+
+        self.stdout.write('%s: %d requests in %.2fs, %.1f requests/s' % (
+            self.url, len(results), elapsed, len(results) / max(elapsed, 1e-6)))
+        self.stdout.write('latency ms: median %.1f, p95 %.1f, max %.1f' % (
+            statistics.median(durations),
+            durations[min(int(len(durations) * 0.95), len(durations) - 1)],
+            durations[-1]))
+        self.stdout.write('%.2f queries/request, %.2f writes/request' % (
+            per_request(2), per_request(3)))
+
+        if errors:
+            self.stdout.write(self.style.ERROR('%d error responses' % errors))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import CatalogStatistics
+
+
+class Command(BaseCommand):
+    help = 'Recount the catalog totals shown on the home page'
+
+    def handle(self, *args, **options):
+        statistics = CatalogStatistics.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{statistics.books} books, {statistics.copies} copies '
+            f'({statistics.available_copies} available), '
+            f'{statistics.authors} authors, {statistics.genres} genres'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from catalog import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text index of the catalog books'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to rebuild the index on')
+
+    def handle(self, *args, **options):
+        using = options['database']
+
+        if not search.is_supported(connections[using]):
+            self.stdout.write(self.style.WARNING(
+                'Full-text search is not supported on this database, nothing to do'))
+            return
+
+        with transaction.atomic(using=using):
+            search.rebuild_index(using=using)
+
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
@@ -0,0 +1,122 @@
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef, Q
+from django.template.loader import render_to_string
+
+from catalog.models import BookInstance, OverdueNotice
+
+
+class Command(BaseCommand):
+    help = ('Email every borrower one digest of their overdue loans. Loans '
+            'already notified for their current due date are skipped')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Overdue loans read per query')
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Emails handed to the email backend at once')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Render the digests without sending or recording them')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        self.connection = get_connection()
+        self.outbox = []
+        self.sent = self.skipped = 0
+
+        started = time.monotonic()
+
+        borrower, loans = None, []
+        for loan in self.overdue_loans(options['chunk_size']):
+            if loan.borrower_id != getattr(borrower, 'pk', None):
+                self.add_digest(borrower, loans)
+                borrower, loans = loan.borrower, []
+
+            loans.append(loan)
+
+        self.add_digest(borrower, loans)
+        self.flush()
+
+        self.stdout.write(self.style.SUCCESS(
+            '%s %d overdue notices in %.1fs, skipped %d borrowers without an email address' % (
+                'Rendered' if self.dry_run else 'Sent', self.sent,
+                time.monotonic() - started, self.skipped)))
+
+    def overdue_loans(self, chunk_size):
+        """Overdue loans not yet notified, read in (borrower, id) keyset chunks"""
+
+        already_notified = OverdueNotice.objects.filter(
+            bookinstance=OuterRef('pk'), due_back=OuterRef('due_back'))
+
+        loans = BookInstance.objects.overdue().filter(
+            borrower__isnull=False
+        ).exclude(
+            Exists(already_notified)
+        ).select_related('book', 'borrower').only(
+            'due_back', 'book', 'book__title', 'borrower', 'borrower__username',
+            'borrower__email',
+            'borrower__first_name', 'borrower__last_name'
+        ).order_by('borrower', 'pk')
+
+        position = None
+        while True:
+            chunk = loans
+            if position is not None:
+                borrower_id, pk = position
+                chunk = loans.filter(
+                    Q(borrower__gt=borrower_id) | Q(borrower=borrower_id, pk__gt=pk))
+
+            chunk = list(chunk[:chunk_size])
+            yield from chunk
+
+            if len(chunk) < chunk_size:
+                return
+
+            position = (chunk[-1].borrower_id, chunk[-1].pk)
+
+    def add_digest(self, borrower, loans):
+        if not loans:
+            return
+
+        if not borrower.email:
+            self.skipped += 1
+            return
+
+        context = {'user': borrower, 'loans': loans}
+        message = EmailMessage(
+            subject=render_to_string(
+                'catalog/email/overdue_notice_subject.txt', context).strip(),
+            body=render_to_string('catalog/email/overdue_notice.txt', context),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[borrower.email],
+            connection=self.connection,
+        )
+
+        self.outbox.append((message, loans))
+        if len(self.outbox) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.outbox:
+            return
+
+        if not self.dry_run:
+            self.connection.send_messages([message for message, _ in self.outbox])
+
+            # Recorded once handed to the backend: a crash in between sends
+            # the digest again rather than never
+            OverdueNotice.objects.bulk_create([
+                OverdueNotice(bookinstance_id=loan.pk, borrower_id=loan.borrower_id,
+                              due_back=loan.due_back)
+                for _, loans in self.outbox for loan in loans
+            ], ignore_conflicts=True)
+
+        self.sent += len(self.outbox)
+        self.outbox = []
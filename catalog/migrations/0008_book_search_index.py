@@ -0,0 +1,42 @@
+# Generated by Django 3.2 on 2026-10-16 23:34
+
+import catalog.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+from catalog import search
+
+
+def create_search_index(apps, schema_editor):
+    search.create_index(schema_editor)
+    search.rebuild_index(using=schema_editor.connection.alias)
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_book_number_of_pages'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSearchEntry',
+            fields=[
+                ('book', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='catalog.book')),
+                ('document', catalog.fields.SearchDocumentField()),
+            ],
+            options={
+                'db_table': 'catalog_book_search',
+                'managed': False,
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='genre',
+            options={'ordering': ['name']},
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
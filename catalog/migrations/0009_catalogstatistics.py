@@ -0,0 +1,27 @@
+# Generated by Django 3.2 on 2026-10-16 23:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_book_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogStatistics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('books', models.IntegerField(default=0)),
+                ('copies', models.IntegerField(default=0)),
+                ('available_copies', models.IntegerField(default=0)),
+                ('authors', models.IntegerField(default=0)),
+                ('genres', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'catalog statistics',
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-16 23:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_catalogstatistics'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(fields=['status', 'due_back'], name='catalog_loan_status_due_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-17 00:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0013_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogstatistics',
+            name='visits',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -1,13 +1,24 @@
 from django.db import models
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.db.models import F
 import uuid
 from datetime import date
 
+from .fields import SearchDocumentField
+
 
 class Publisher(models.Model):
     name = models.CharField(max_length=100)
 
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'id'],
+                         name='catalog_publisher_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -20,8 +31,13 @@ class Genre(models.Model):
     name = models.CharField(
         max_length=200, help_text='Enter a book genre (e.g. Science Fiction)')
 
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'id'], name='catalog_genre_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -38,8 +54,14 @@ class Author(models.Model):
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField('died', null=True, blank=True)
 
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
         ordering = ['last_name', 'first_name']
+        indexes = [
+            models.Index(fields=['last_name', 'first_name', 'id'],
+                         name='catalog_author_name_idx'),
+        ]
 
     def get_absolute_url(self):
         return reverse("author-detail", args=[str(self.id)])
@@ -56,6 +78,21 @@ class Language(models.Model):
         return self.name
 
 
+class BookInstanceQuerySet(models.QuerySet):
+
+    def overdue(self):
+        """Copies on loan past their due date"""
+        return self.filter(status__exact='o', due_back__lt=date.today())
+
+    def annotate_overdue(self):
+        """Add an ``overdue`` flag computed by the database"""
+        return self.annotate(overdue=models.Case(
+            models.When(status__exact='o', due_back__lt=date.today(),
+                        then=models.Value(True)),
+            default=models.Value(False),
+            output_field=models.BooleanField()))
+
+
 class BookInstance(models.Model):
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4,
@@ -86,13 +123,25 @@ class BookInstance(models.Model):
     borrower = models.ForeignKey(
         User, on_delete=models.SET_NULL, null=True, blank=True)
 
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BookInstanceQuerySet.as_manager()
+
     class Meta:
         ordering = ['due_back']
         permissions = (("can_mark_returned", "Set book as returned"),)
+        indexes = [
+            models.Index(fields=['status', 'due_back'],
+                         name='catalog_loan_status_due_idx'),
+            models.Index(fields=['borrower', 'status', 'due_back'],
+                         name='catalog_loan_borrower_idx'),
+        ]
 
     @property
     def is_overdue(self):
-        if self.due_back and date.today() > self.due_back:
+        """Python side of BookInstanceQuerySet.overdue(), for a single copy.
+            Lists should use annotate_overdue() instead"""
+        if self.status == 'o' and self.due_back and date.today() > self.due_back:
             return True
 
         return False
@@ -120,6 +169,13 @@ class Book(models.Model):
 
     language = models.ForeignKey('Language', on_delete=models.SET, null=True)
 
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['title', 'id'], name='catalog_book_title_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -127,6 +183,100 @@ class Book(models.Model):
         return reverse("book-detail", args=[str(self.id)])
 
     def display_genre(self):
-        return ', '.join(genre.name for genre in self.genre.all()[:3])
+        # Slice in python so a prefetched genre list is reused
+        return ', '.join(genre.name for genre in list(self.genre.all())[:3])
 
     display_genre.short_description = "Genre"
+
+
+class BookSearchEntry(models.Model):
+    """Row of the full-text index maintained by catalog.search"""
+
+    book = models.OneToOneField(
+        Book, on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='rowid', related_name='search_entry')
+
+    document = SearchDocumentField()
+
+    class Meta:
+        managed = False
+        db_table = 'catalog_book_search'
+
+
+class CatalogStatistics(models.Model):
+    """Running totals shown on the home page.
+
+        Kept up to date by signal handlers on Book, BookInstance, Author and
+        Genre. Bulk operations bypass signals, so run the
+        rebuild_catalog_statistics command after them. ``visits`` is added
+        to in batches by catalog.visits and cannot be rebuilt"""
+
+    books = models.IntegerField(default=0)
+    copies = models.IntegerField(default=0)
+    available_copies = models.IntegerField(default=0)
+    authors = models.IntegerField(default=0)
+    genres = models.IntegerField(default=0)
+    visits = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'catalog statistics'
+
+    def __str__(self):
+        return 'Catalog statistics'
+
+    @classmethod
+    def load(cls):
+        statistics = cls.objects.filter(pk=1).first()
+        if statistics is None:
+            statistics = cls.rebuild()
+
+        return statistics
+
+    @classmethod
+    def rebuild(cls):
+        statistics, _ = cls.objects.update_or_create(pk=1, defaults={
+            'books': Book.objects.count(),
+            'copies': BookInstance.objects.count(),
+            'available_copies': BookInstance.objects.filter(status__exact='a').count(),
+            'authors': Author.objects.count(),
+            'genres': Genre.objects.count(),
+        })
+
+        return statistics
+
+    @classmethod
+    def adjust(cls, **deltas):
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        updated = cls.objects.filter(pk=1).update(
+            **{name: F(name) + delta for name, delta in deltas.items()})
+
+        if not updated:
+            cls.rebuild()
+
+            # The rebuilt totals include every other delta already
+            if 'visits' in deltas:
+                cls.objects.filter(pk=1).update(
+                    visits=F('visits') + deltas['visits'])
+
+
+class OverdueNotice(models.Model):
+    """Overdue notice sent for a loan, one per due date so that running
+        send_overdue_notices again does not notify twice"""
+
+    bookinstance = models.ForeignKey(
+        'BookInstance', on_delete=models.CASCADE, related_name='overdue_notices')
+    borrower = models.ForeignKey(User, on_delete=models.CASCADE)
+    due_back = models.DateField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['bookinstance', 'due_back'], name='catalog_unique_overdue_notice'),
+        ]
+
+    def __str__(self):
+        return f'{self.bookinstance_id} due {self.due_back}'
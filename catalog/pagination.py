@@ -0,0 +1,371 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ValidationError
+from django.core.paginator import EmptyPage, InvalidPage, Page, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, Q, QuerySet
+from django.http import Http404
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorPage:
+    """Page of a CursorPaginator, shaped like django's Page so the
+        ListView context and templates can use it"""
+
+    is_cursor_page = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page of %s items>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset paginator.
+
+        Pages are fetched with ``WHERE (ordering columns) > position`` instead
+        of OFFSET, so every page costs the same and no COUNT(*) is needed.
+        The ordering always ends with the primary key as a tie-breaker and
+        NULLs sort after every other value. Cursors are opaque url-safe
+        tokens holding the position and the direction to read in"""
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = self._resolve_ordering(queryset, ordering)
+
+    def _resolve_ordering(self, queryset, ordering):
+        ordering = list(ordering)
+        model_fields = queryset.model._meta
+        resolved = []
+
+        for name in ordering:
+            if not isinstance(name, str):
+                raise ImproperlyConfigured(
+                    'CursorPaginator only supports field name orderings, got %r' % name)
+
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+
+            if name in queryset.query.annotations:
+                nullable = False
+            else:
+                try:
+                    field = model_fields.pk if name == 'pk' else model_fields.get_field(name)
+                except FieldDoesNotExist:
+                    raise ImproperlyConfigured(
+                        'Cannot paginate %s by %r' % (model_fields.label, name))
+
+                if field.primary_key:
+                    name = 'pk'
+                nullable = field.null
+
+            resolved.append((name, descending, nullable))
+
+        if 'pk' not in [name for name, _, _ in resolved]:
+            resolved.append(('pk', False, False))
+
+        return resolved
+
+    def encode_cursor(self, obj, reverse):
+        # Rows of a .values() queryset are dicts
+        if isinstance(obj, dict):
+            position = [obj[name] for name, _, _ in self.ordering]
+        else:
+            position = [getattr(obj, name) for name, _, _ in self.ordering]
+        data = json.dumps({'p': position, 'r': reverse}, cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padding = '=' * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(cursor + padding))
+            position, reverse = data['p'], bool(data['r'])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise InvalidCursor('Invalid cursor')
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise InvalidCursor('Invalid cursor')
+
+        return self._to_python(position), reverse
+
+    def _to_python(self, position):
+        """Position values converted by their fields, so a tampered cursor
+            is rejected here instead of failing the query"""
+
+        model_fields = self.queryset.model._meta
+        values = []
+
+        for (name, _, _), value in zip(self.ordering, position):
+            if name in self.queryset.query.annotations:
+                values.append(value)
+                continue
+
+            field = model_fields.pk if name == 'pk' else model_fields.get_field(name)
+            try:
+                values.append(field.to_python(value))
+            except (ValidationError, ValueError, TypeError):
+                raise InvalidCursor('Invalid cursor')
+
+        return values
+
+    def _order_by(self, reverse):
+        order_by = []
+        for name, descending, nullable in self.ordering:
+            descending = descending != reverse
+            if not nullable:
+                order_by.append(('-' if descending else '') + name)
+            elif descending:
+                order_by.append(F(name).desc(nulls_first=True))
+            else:
+                order_by.append(F(name).asc(nulls_last=True))
+
+        return order_by
+
+    def _beyond(self, name, descending, nullable, value):
+        """Rows strictly after ``value`` in a single column"""
+
+        if descending:
+            if value is None:
+                return Q(**{name + '__isnull': False})
+            return Q(**{name + '__lt': value})
+
+        if value is None:
+            return None
+
+        condition = Q(**{name + '__gt': value})
+        if nullable:
+            condition |= Q(**{name + '__isnull': True})
+
+        return condition
+
+    def _after(self, position, reverse):
+        condition = None
+        equal = Q()
+
+        for (name, descending, nullable), value in zip(self.ordering, position):
+            beyond = self._beyond(name, descending != reverse, nullable, value)
+            if beyond is not None:
+                beyond = equal & beyond
+                condition = beyond if condition is None else condition | beyond
+
+            if value is None:
+                equal &= Q(**{name + '__isnull': True})
+            else:
+                equal &= Q(**{name: value})
+
+        return condition
+
+    def page(self, cursor=None):
+        reverse = False
+        queryset = self.queryset
+
+        if cursor:
+            position, reverse = self.decode_cursor(cursor)
+            condition = self._after(position, reverse)
+            if condition is None:
+                return CursorPage([], self)
+            queryset = queryset.filter(condition)
+
+        rows = list(queryset.order_by(
+            *self._order_by(reverse))[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(cursor)
+
+        if not rows:
+            return CursorPage(rows, self)
+
+        return CursorPage(
+            rows, self,
+            next_cursor=self.encode_cursor(rows[-1], False) if has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], True) if has_previous else None,
+        )
+
+
+def estimate_count(queryset):
+    """Row count of the queryset's table from the planner statistics, or
+        None when the database keeps none"""
+
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+
+    # reltuples is -1 for a table that was never vacuumed or analyzed
+    if row is None or row[0] < 0:
+        return None
+
+    return int(row[0])
+
+
+class EstimatedPage(Page):
+    """Page of an estimated count, which knows whether rows follow it
+        whatever the estimate says"""
+
+    def __init__(self, object_list, number, paginator, has_more):
+        super().__init__(object_list, number, paginator)
+        self.has_more = has_more
+
+    def has_next(self):
+        return self.has_more
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator approximating the size of large tables.
+
+        An exact COUNT(*) is a full scan. When the queryset reads a whole
+        table, the planner's row estimate is used on PostgreSQL, and the
+        exact count, cached for PAGINATOR_COUNT_CACHE_TIMEOUT seconds, on
+        other databases. Both only apply above PAGINATOR_ESTIMATE_THRESHOLD
+        rows, smaller or filtered sets are counted exactly. ``is_estimated``
+        tells templates the count is approximate.
+
+        With an estimate, each page reads one row more than it shows to
+        tell whether a next page exists, so pages past the estimated last
+        one are reached when the estimate is too low, and a page ending the
+        table has no next page when it is too high. Pages past the end of
+        the table are empty and rejected"""
+
+    estimate_threshold = None
+
+    is_estimated = False
+
+    def get_estimate_threshold(self):
+        if self.estimate_threshold is not None:
+            return self.estimate_threshold
+
+        return settings.PAGINATOR_ESTIMATE_THRESHOLD
+
+    def can_estimate(self):
+        queryset = self.object_list
+        return (
+            isinstance(queryset, QuerySet)
+            and not queryset.query.where
+            and not queryset.query.distinct
+        )
+
+    @cached_property
+    def count(self):
+        if not self.can_estimate():
+            return super().count
+
+        threshold = self.get_estimate_threshold()
+        queryset = self.object_list
+
+        estimate = estimate_count(queryset)
+        if estimate is not None:
+            if estimate > threshold:
+                self.is_estimated = True
+                return estimate
+
+            return super().count
+
+        cache_key = 'catalog:count:%s:%s' % (
+            queryset.db, queryset.model._meta.db_table)
+
+        count = cache.get(cache_key)
+        if count is not None:
+            self.is_estimated = True
+            return count
+
+        count = super().count
+        if count > threshold:
+            cache.set(cache_key, count, settings.PAGINATOR_COUNT_CACHE_TIMEOUT)
+
+        return count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # Past the estimated last page, page() checks for rows there
+            if self.is_estimated and int(number) > 1:
+                return int(number)
+            raise
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.is_estimated:
+            return super().page(number)
+
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not object_list and number > 1:
+            raise EmptyPage(_('That page contains no results'))
+
+        return EstimatedPage(
+            object_list[:self.per_page], number, self, len(object_list) > self.per_page)
+
+
+class CursorPaginationMixin:
+    """Let a ListView be paged by cursor on request.
+
+        Requests carrying the ``cursor`` parameter (empty for the first page)
+        get keyset pages built on the queryset ordering, or the model's
+        Meta.ordering, with the primary key as tie-breaker. Other requests
+        keep the regular numbered pages"""
+
+    cursor_kwarg = 'cursor'
+
+    def get_cursor_ordering(self, queryset):
+        if queryset.query.order_by:
+            return queryset.query.order_by
+
+        if queryset.query.default_ordering:
+            return queryset.model._meta.ordering
+
+        return []
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.cursor_kwarg not in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = CursorPaginator(
+            queryset, page_size, self.get_cursor_ordering(queryset))
+
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+
+        return (paginator, page, page.object_list, page.has_other_pages())
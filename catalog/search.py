@@ -0,0 +1,153 @@
+"""Full-text search over the catalog.
+
+Books are indexed by title, summary, author name and genre names in
+``catalog_book_search``: an FTS5 virtual table on SQLite and a table with a
+GIN indexed tsvector column on PostgreSQL. Other databases fall back to a
+plain title lookup.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import F
+
+from .fields import SearchRank
+from .models import Book
+
+SEARCH_TABLE = 'catalog_book_search'
+
+SUPPORTED_VENDORS = ('sqlite', 'postgresql')
+
+# Keeps the IN (...) lists below SQLite's host parameter limit
+INDEX_BATCH_SIZE = 500
+
+_SQLITE_CREATE = (
+    "CREATE VIRTUAL TABLE catalog_book_search USING fts5("
+    "title, summary, author, genre, tokenize='porter unicode61')",
+    # Column weights used by the hidden rank column: title, summary, author, genre
+    "INSERT INTO catalog_book_search(catalog_book_search, rank) "
+    "VALUES('rank', 'bm25(10.0, 1.0, 5.0, 2.0)')",
+)
+
+_POSTGRESQL_CREATE = (
+    "CREATE TABLE catalog_book_search ("
+    "rowid integer PRIMARY KEY REFERENCES catalog_book (id) "
+    "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX catalog_book_search_document_gin "
+    "ON catalog_book_search USING GIN (document)",
+)
+
+_GENRE_NAMES = {
+    'sqlite': (
+        "(SELECT group_concat(g.name, ' ') FROM catalog_book_genre bg "
+        "INNER JOIN catalog_genre g ON g.id = bg.genre_id WHERE bg.book_id = b.id)"
+    ),
+    'postgresql': (
+        "(SELECT string_agg(g.name, ' ') FROM catalog_book_genre bg "
+        "INNER JOIN catalog_genre g ON g.id = bg.genre_id WHERE bg.book_id = b.id)"
+    ),
+}
+
+_AUTHOR_NAME = "COALESCE(a.first_name || ' ' || a.last_name, '')"
+
+_INSERT = {
+    'sqlite': (
+        "INSERT INTO catalog_book_search(rowid, title, summary, author, genre) "
+        "SELECT b.id, b.title, b.summary, %s, COALESCE(%s, '') "
+        % (_AUTHOR_NAME, _GENRE_NAMES['sqlite'])
+    ),
+    'postgresql': (
+        "INSERT INTO catalog_book_search(rowid, document) "
+        "SELECT b.id, "
+        "setweight(to_tsvector('english', b.title), 'A') || "
+        "setweight(to_tsvector('english', %s), 'B') || "
+        "setweight(to_tsvector('english', COALESCE(%s, '')), 'C') || "
+        "setweight(to_tsvector('english', b.summary), 'D') "
+        % (_AUTHOR_NAME, _GENRE_NAMES['postgresql'])
+    ),
+}
+
+_FROM = "FROM catalog_book b LEFT OUTER JOIN catalog_author a ON a.id = b.author_id"
+
+
+def is_supported(connection):
+    return connection.vendor in SUPPORTED_VENDORS
+
+
+def create_index(schema_editor):
+    statements = {
+        'sqlite': _SQLITE_CREATE,
+        'postgresql': _POSTGRESQL_CREATE,
+    }.get(schema_editor.connection.vendor, ())
+
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_index(schema_editor):
+    if is_supported(schema_editor.connection):
+        schema_editor.execute('DROP TABLE IF EXISTS %s' % SEARCH_TABLE)
+
+
+def rebuild_index(using=None):
+    """Re-index every book in a single INSERT ... SELECT"""
+
+    connection = connections[using or router.db_for_write(Book)]
+    if not is_supported(connection):
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s' % SEARCH_TABLE)
+        cursor.execute('%s %s' % (_INSERT[connection.vendor], _FROM))
+
+
+def index_books(book_ids, using=None):
+    """Refresh the index entries of the given books.
+
+        Ids of deleted books simply drop out of the index"""
+
+    connection = connections[using or router.db_for_write(Book)]
+    if not is_supported(connection):
+        return
+
+    book_ids = list(book_ids)
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(book_ids), INDEX_BATCH_SIZE):
+            batch = book_ids[start:start + INDEX_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+
+            cursor.execute('DELETE FROM %s WHERE rowid IN (%s)' % (
+                SEARCH_TABLE, placeholders), batch)
+            cursor.execute('%s %s WHERE b.id IN (%s)' % (
+                _INSERT[connection.vendor], _FROM, placeholders), batch)
+
+
+def build_query(terms, vendor):
+    """Match every term, treating the last one as a prefix so results
+        follow the user while they type"""
+
+    if vendor == 'sqlite':
+        return ' '.join('"%s"' % term for term in terms) + '*'
+
+    return ' & '.join(terms) + ':*'
+
+
+def search_books(queryset, query):
+    """Filter ``queryset`` down to the books matching ``query``, best match first"""
+
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return queryset
+
+    connection = connections[queryset.db]
+    if not is_supported(connection):
+        return queryset.filter(title__icontains=query)
+
+    match = build_query(terms, connection.vendor)
+
+    return queryset.filter(
+        search_entry__document__match=match
+    ).annotate(
+        search_rank=SearchRank(F('search_entry__document'), match)
+    ).order_by('-search_rank', 'pk')
@@ -0,0 +1,186 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import search
+from .models import Author, Book, BookInstance, CatalogStatistics, Genre, Language, Publisher
+
+STATISTICS_FIELDS = {
+    Book: 'books',
+    Author: 'authors',
+    Genre: 'genres',
+}
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def update_book_search_entry(sender, instance, using, **kwargs):
+    search.index_books([instance.pk], using=using)
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def update_search_entries_on_genre_change(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if reverse and action == 'pre_clear':
+        instance._search_book_ids = list(
+            instance.book_set.values_list('pk', flat=True))
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        book_ids = [instance.pk]
+    elif action == 'post_clear':
+        book_ids = getattr(instance, '_search_book_ids', [])
+    else:
+        book_ids = pk_set
+
+    search.index_books(book_ids, using=using)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+def update_search_entries_on_rename(sender, instance, created, using, **kwargs):
+    if not created:
+        search.index_books(
+            instance.book_set.values_list('pk', flat=True), using=using)
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Genre)
+def remember_indexed_books(sender, instance, **kwargs):
+    instance._search_book_ids = list(
+        instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def update_search_entries_on_delete(sender, instance, using, **kwargs):
+    search.index_books(getattr(instance, '_search_book_ids', []), using=using)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        CatalogStatistics.adjust(**{STATISTICS_FIELDS[sender]: 1})
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def count_deleted(sender, instance, **kwargs):
+    CatalogStatistics.adjust(**{STATISTICS_FIELDS[sender]: -1})
+
+
+@receiver(pre_save, sender=BookInstance)
+def remember_previous_status(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance._previous_status, instance._previous_book_id, instance._previous_imprint_id = (
+            sender.objects.filter(pk=instance.pk).values_list(
+                'status', 'book_id', 'imprint_id').first() or (None, None, None))
+
+
+@receiver(post_save, sender=BookInstance)
+def count_saved_copy(sender, instance, created, **kwargs):
+    if created:
+        CatalogStatistics.adjust(
+            copies=1, available_copies=int(instance.status == 'a'))
+        return
+
+    was_available = getattr(instance, '_previous_status', None) == 'a'
+    CatalogStatistics.adjust(
+        available_copies=int(instance.status == 'a') - int(was_available))
+
+
+@receiver(post_delete, sender=BookInstance)
+def count_deleted_copy(sender, instance, **kwargs):
+    CatalogStatistics.adjust(
+        copies=-1, available_copies=-int(instance.status == 'a'))
+
+
+def touch_books(using=None, **filters):
+    """Move ``updated_at`` of the books matching ``filters`` and of the
+        author, genre and publisher pages listing them, so conditional GETs
+        of those pages see the change"""
+
+    books = Book.objects.using(using).filter(**filters).values('pk')
+    now = timezone.now()
+
+    Book.objects.using(using).filter(pk__in=books).update(updated_at=now)
+    Author.objects.using(using).filter(book__in=books).update(updated_at=now)
+    Genre.objects.using(using).filter(book__in=books).update(updated_at=now)
+    Publisher.objects.using(using).filter(
+        bookinstance__book__in=books).update(updated_at=now)
+
+
+@receiver(pre_save, sender=Book)
+@receiver(pre_delete, sender=Book)
+def touch_pages_listing_book(sender, instance, using, **kwargs):
+    # Before saving, for the author the book may be moved away from
+    if not instance._state.adding:
+        touch_books(using, pk=instance.pk)
+
+
+@receiver(post_save, sender=Book)
+def touch_pages_listing_saved_book(sender, instance, created, using, **kwargs):
+    if not created:
+        touch_books(using, pk=instance.pk)
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def touch_pages_on_genre_change(sender, instance, action, reverse, pk_set, using, **kwargs):
+    # Removed relations are touched before they go, added ones after
+    if action not in ('pre_remove', 'pre_clear', 'post_add'):
+        return
+
+    if not reverse:
+        touch_books(using, pk=instance.pk)
+        Genre.objects.using(using).filter(
+            pk__in=pk_set or ()).update(updated_at=timezone.now())
+    elif action == 'pre_clear':
+        touch_books(using, genre=instance)
+    else:
+        touch_books(using, pk__in=pk_set)
+        Genre.objects.using(using).filter(
+            pk=instance.pk).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Author)
+@receiver(pre_delete, sender=Author)
+def touch_pages_showing_author(sender, instance, using, created=False, **kwargs):
+    if not created:
+        touch_books(using, author=instance)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(pre_delete, sender=Genre)
+def touch_pages_showing_genre(sender, instance, using, created=False, **kwargs):
+    if not created:
+        touch_books(using, genre=instance)
+
+
+@receiver(post_save, sender=Language)
+def touch_pages_showing_language(sender, instance, using, created=False, **kwargs):
+    if not created:
+        touch_books(using, language=instance)
+
+
+@receiver(post_save, sender=Publisher)
+@receiver(pre_delete, sender=Publisher)
+def touch_pages_showing_publisher(sender, instance, using, created=False, **kwargs):
+    if not created:
+        Book.objects.using(using).filter(
+            bookinstance__imprint=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def touch_pages_showing_copy(sender, instance, using, **kwargs):
+    now = timezone.now()
+    book_ids = {instance.book_id, getattr(instance, '_previous_book_id', None)}
+    imprint_ids = {instance.imprint_id, getattr(instance, '_previous_imprint_id', None)}
+
+    Book.objects.using(using).filter(pk__in=book_ids - {None}).update(updated_at=now)
+    Publisher.objects.using(using).filter(
+        pk__in=imprint_ids - {None}).update(updated_at=now)
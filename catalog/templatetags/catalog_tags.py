@@ -0,0 +1,19 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def query_transform(context, **kwargs):
+    """Return the current query string with the given keys replaced,
+        so page links keep the active filters"""
+
+    query = context['request'].GET.copy()
+
+    for key, value in kwargs.items():
+        if value is None:
+            query.pop(key, None)
+        else:
+            query[key] = value
+
+    return query.urlencode()
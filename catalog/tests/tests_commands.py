@@ -0,0 +1,296 @@
+from django.contrib.auth.models import User
+from django.core import mail
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+
+from catalog.models import Author, Book, BookInstance, CatalogStatistics, Genre, OverdueNotice
+from catalog.search import search_books
+
+import datetime
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+
+class ImportCatalogCommandTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as input_file:
+            input_file.write(content)
+
+        return path
+
+    def import_catalog(self, path, **options):
+        output = io.StringIO()
+        call_command('import_catalog', path, stdout=output, **options)
+        return output.getvalue()
+
+    def test_imports_csv(self):
+        path = self.write('books.csv', (
+            'isbn,title,summary,author_first_name,author_last_name,genres,language,imprint,copies\n'
+            '9780261102217,The Hobbit,There and back,John,Tolkien,Fantasy;Classic,English,Allen,2\n'
+            '9780261102385,The Lord of the Rings,One ring,John,Tolkien,Fantasy,English,Allen,1\n'
+            ',No ISBN,,,,,,,\n'
+        ))
+
+        output = self.import_catalog(path)
+
+        self.assertIn('Imported 2 books', output)
+        self.assertIn('skipped 1', output)
+        self.assertEqual(Author.objects.count(), 1)
+        self.assertEqual(Genre.objects.count(), 2)
+
+        hobbit = Book.objects.get(isbn='9780261102217')
+        self.assertEqual(hobbit.author.last_name, 'Tolkien')
+        self.assertEqual(hobbit.language.name, 'English')
+        self.assertEqual(
+            sorted(hobbit.genre.values_list('name', flat=True)), ['Classic', 'Fantasy'])
+        self.assertEqual(hobbit.bookinstance_set.filter(
+            status='a', imprint__name='Allen').count(), 2)
+
+        self.assertEqual(CatalogStatistics.objects.get().copies, 3)
+        self.assertEqual(
+            list(search_books(Book.objects.all(), 'ring')),
+            [Book.objects.get(isbn='9780261102385')])
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+    def test_skips_values_too_long_for_their_field(self):
+        path = self.write('books.jsonl', '\n'.join(json.dumps(record) for record in [
+            {'isbn': '9780261102217', 'title': 'T' * 201, 'author': 'Tolkien, John'},
+            {'isbn': '9780261102385', 'title': 'The Lord of the Rings',
+             'author_first_name': 'John', 'author_last_name': 'T' * 101},
+            {'isbn': '9780441172719', 'title': 'Dune', 'genres': ['G' * 201]},
+            {'isbn': '97804411727190', 'title': 'Long ISBN'},
+            {'isbn': '9780007117116', 'title': 'T' * 200, 'author': 'Herbert, Frank'},
+        ]))
+
+        output = self.import_catalog(path)
+
+        self.assertIn('Imported 1 books', output)
+        self.assertIn('skipped 4', output)
+        self.assertEqual(list(Book.objects.values_list('isbn', flat=True)), ['9780007117116'])
+        self.assertEqual(list(Author.objects.values_list('last_name', flat=True)), ['Herbert'])
+        self.assertFalse(Genre.objects.exists())
+
+    def test_upserts_jsonl_by_isbn(self):
+        Genre.objects.create(name='Fantasy')
+        Book.objects.create(
+            title='Hobit', summary='Typo', isbn='9780261102217')
+
+        path = self.write('books.jsonl', '\n'.join(json.dumps(record) for record in [
+            {'isbn': '9780261102217', 'title': 'The Hobbit', 'author': 'Tolkien, John',
+             'genres': ['Fantasy'], 'copies': 3},
+            {'isbn': '9780441172719', 'title': 'Dune', 'author': 'Herbert, Frank'},
+        ]))
+
+        self.import_catalog(path)
+
+        self.assertEqual(Book.objects.count(), 2)
+        hobbit = Book.objects.get(isbn='9780261102217')
+        self.assertEqual(hobbit.title, 'The Hobbit')
+        self.assertEqual(hobbit.author.first_name, 'John')
+        self.assertEqual(list(hobbit.genre.values_list('name', flat=True)), ['Fantasy'])
+        self.assertEqual(Genre.objects.count(), 1)
+        # copies are only created along with new books
+        self.assertEqual(BookInstance.objects.count(), 0)
+
+    def test_resumes_from_checkpoint(self):
+        path = self.write('books.jsonl', '\n'.join(json.dumps(
+            {'isbn': f'97800000000{number:02}', 'title': f'Book {number}', 'copies': 1}
+        ) for number in range(10)))
+
+        with open(path + '.checkpoint', 'w') as checkpoint:
+            checkpoint.write('6')
+
+        output = self.import_catalog(path, resume=True, batch_size=3)
+
+        self.assertIn('Imported 4 books', output)
+        self.assertEqual(
+            sorted(Book.objects.values_list('title', flat=True)),
+            ['Book 6', 'Book 7', 'Book 8', 'Book 9'])
+
+
+class ExportCatalogCommandTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(5):
+            book = Book.objects.create(
+                title=f'Book {number}', summary='Book summary',
+                isbn=f'97800000000{number:02}')
+            BookInstance.objects.create(book=book, status='a')
+
+    def test_exports_jsonl_in_batches(self):
+        output = io.StringIO()
+        call_command('export_catalog', format='jsonl', batch_size=2, stdout=output)
+
+        rows = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([row['title'] for row in rows],
+                         [f'Book {number}' for number in range(5)])
+        self.assertTrue(all(row['copies_available'] == 1 for row in rows))
+
+    def test_exports_csv_to_a_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'books.csv')
+            call_command('export_catalog', output=path)
+
+            with open(path) as export:
+                self.assertEqual(len(export.readlines()), 6)
+
+
+class SendOverdueNoticesCommandTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader1 = User.objects.create_user(
+            username='reader1', email='reader1@example.com', first_name='Ann')
+        cls.reader2 = User.objects.create_user(
+            username='reader2', email='reader2@example.com')
+        no_email = User.objects.create_user(username='reader3')
+
+        today = datetime.date.today()
+        cls.overdue = today - datetime.timedelta(days=3)
+
+        for number, borrower in enumerate(
+                [cls.reader1, cls.reader1, cls.reader1, cls.reader2, no_email]):
+            book = Book.objects.create(
+                title=f'Book {number}', summary='Book summary',
+                isbn=f'97800000000{number:02}')
+            BookInstance.objects.create(
+                book=book, borrower=borrower, status='o', due_back=cls.overdue)
+
+        BookInstance.objects.create(
+            book=book, borrower=cls.reader2, status='o',
+            due_back=today + datetime.timedelta(days=3))
+
+    def send_notices(self, **options):
+        output = io.StringIO()
+        call_command('send_overdue_notices', stdout=output, **options)
+        return output.getvalue()
+
+    def test_sends_one_digest_per_borrower(self):
+        output = self.send_notices(chunk_size=2, batch_size=1)
+
+        self.assertIn('Sent 2 overdue notices', output)
+        self.assertIn('skipped 1 borrowers', output)
+
+        messages = {message.to[0]: message for message in mail.outbox}
+        self.assertEqual(len(mail.outbox), 2)
+
+        digest = messages['reader1@example.com']
+        self.assertEqual(digest.subject, '3 library books are overdue')
+        self.assertIn('Hello Ann', digest.body)
+        for number in range(3):
+            self.assertIn(f'Book {number}, due', digest.body)
+
+        self.assertEqual(
+            messages['reader2@example.com'].subject, 'A library book is overdue')
+        self.assertEqual(OverdueNotice.objects.count(), 4)
+
+    def test_reruns_do_not_notify_twice(self):
+        self.send_notices()
+        mail.outbox = []
+
+        self.send_notices()
+        self.assertEqual(mail.outbox, [])
+
+    def test_renewed_loans_are_notified_again(self):
+        self.send_notices()
+        mail.outbox = []
+
+        loan = BookInstance.objects.filter(borrower=self.reader2).get(
+            due_back=self.overdue)
+        loan.due_back = self.overdue + datetime.timedelta(days=1)
+        loan.save()
+
+        self.send_notices()
+        self.assertEqual([message.to for message in mail.outbox],
+                         [['reader2@example.com']])
+
+    def test_dry_run_sends_nothing(self):
+        output = self.send_notices(dry_run=True)
+
+        self.assertIn('Rendered 2 overdue notices', output)
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(OverdueNotice.objects.exists())
+
+    def email_backend(self, **environ):
+        environ = {
+            **{key: value for key, value in os.environ.items() if key != 'EMAIL_BACKEND'},
+            'DJANGO_SETTINGS_MODULE': 'localLibrary.settings',
+            **environ,
+        }
+        return subprocess.run(
+            [sys.executable, '-c',
+             'import django; django.setup(); '
+             'from django.conf import settings; print(settings.EMAIL_BACKEND)'],
+            env=environ, cwd=settings.BASE_DIR, capture_output=True, text=True,
+            check=True).stdout.strip()
+
+    def test_notices_are_sent_over_smtp_by_default(self):
+        # DEBUG is on in these settings, it must not pick the backend
+        self.assertEqual(
+            self.email_backend(), 'django.core.mail.backends.smtp.EmailBackend')
+        self.assertEqual(
+            self.email_backend(EMAIL_BACKEND='django.core.mail.backends.console.EmailBackend'),
+            'django.core.mail.backends.console.EmailBackend')
+
+
+class LoadtestCommandTest(TestCase):
+
+    def test_reports_database_work_per_request(self):
+        CatalogStatistics.rebuild()
+
+        output = io.StringIO()
+        call_command('loadtest', requests=5, stdout=output)
+
+        output = output.getvalue()
+        self.assertIn('/catalog/: 5 requests', output)
+        self.assertIn('writes/request', output)
+        self.assertNotIn('error responses', output)
+
+    def test_asgi_mode(self):
+        CatalogStatistics.rebuild()
+
+        output = io.StringIO()
+        call_command('loadtest', requests=4, concurrency=2, asgi=True, stdout=output)
+
+        output = output.getvalue()
+        self.assertIn('ASGI, sync views', output)
+        self.assertIn('/catalog/: 4 requests', output)
+        self.assertNotIn('0.00 queries/request', output)
+        self.assertNotIn('error responses', output)
+
+
+class CheckoutBenchmarkCommandTest(TransactionTestCase):
+    # The checkouts run in threads, which only see committed rows
+
+    def benchmark(self, **options):
+        output = io.StringIO()
+        call_command('checkout_benchmark', copies=5, checkouts=8, stdout=output, **options)
+        return output.getvalue()
+
+    def test_every_copy_is_lent_once(self):
+        output = self.benchmark(concurrency=1)
+
+        self.assertIn('5 lent, 3 found no copy, 0 failed', output)
+        self.assertIn('Every copy lent at most once', output)
+        self.assertFalse(Book.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+    def test_no_copy_is_lent_twice_by_concurrent_checkouts(self):
+        # In-memory SQLite fails writes that meet a concurrent one instead
+        # of waiting, so checkouts may fail but never lend a copy twice
+        output = self.benchmark(concurrency=3)
+
+        self.assertIn('Every copy lent at most once', output)
+        self.assertFalse(Book.objects.exists())
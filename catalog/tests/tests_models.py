@@ -1,5 +1,10 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
-from catalog.models import Author
+from catalog import loans
+from catalog.models import Author, Book, BookInstance, CatalogStatistics, Genre, Publisher
+from catalog.search import search_books
+
+import datetime
 
 
 class AuthorModelTest(TestCase):
@@ -42,3 +47,254 @@ class AuthorModelTest(TestCase):
         author = Author.objects.get(id=1)
 
         self.assertEqual(author.get_absolute_url(), '/catalog/author/1')
+
+
+class BookSearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        tolkien = Author.objects.create(first_name='John', last_name='Tolkien')
+        herbert = Author.objects.create(first_name='Frank', last_name='Herbert')
+        cls.fantasy = Genre.objects.create(name='Fantasy')
+
+        cls.hobbit = Book.objects.create(
+            title='The Hobbit', summary='A journey there and back again',
+            isbn='9780261102217', author=tolkien)
+        cls.hobbit.genre.add(cls.fantasy)
+
+        cls.dune = Book.objects.create(
+            title='Dune', summary='A desert planet and a hobbit in passing',
+            isbn='9780441172719', author=herbert)
+
+    def search(self, query):
+        return list(search_books(Book.objects.all(), query))
+
+    def test_matches_title_summary_author_and_genre(self):
+        self.assertEqual(self.search('Dune'), [self.dune])
+        self.assertEqual(self.search('desert'), [self.dune])
+        self.assertEqual(self.search('tolkien'), [self.hobbit])
+        self.assertEqual(self.search('fantasy'), [self.hobbit])
+
+    def test_last_term_matches_as_prefix(self):
+        self.assertEqual(self.search('jour'), [self.hobbit])
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.search('hobbit'), [self.hobbit, self.dune])
+
+    def test_punctuation_is_ignored(self):
+        self.assertEqual(self.search('"dune"!*'), [self.dune])
+        self.assertEqual(self.search('  '), [self.hobbit, self.dune])
+
+    def test_index_follows_book_changes(self):
+        self.dune.title = 'Children of Dune'
+        self.dune.save()
+        self.assertEqual(self.search('children'), [self.dune])
+
+        self.dune.genre.add(self.fantasy)
+        self.assertEqual(self.search('fantasy'), [self.hobbit, self.dune])
+
+        self.dune.delete()
+        self.assertEqual(self.search('children'), [])
+
+    def test_index_follows_author_and_genre_renames(self):
+        self.fantasy.name = 'Epic'
+        self.fantasy.save()
+        self.assertEqual(self.search('epic'), [self.hobbit])
+
+        author = self.hobbit.author
+        author.last_name = 'Tolkien Jr'
+        author.save()
+        self.assertEqual(self.search('jr'), [self.hobbit])
+
+
+class CatalogStatisticsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Big', last_name='bob')
+        cls.genre = Genre.objects.create(name='Fantasy')
+        cls.book = Book.objects.create(
+            title='Book title', summary='Book summary', isbn='9780261102217',
+            author=author)
+        BookInstance.objects.create(book=cls.book, status='a')
+        BookInstance.objects.create(book=cls.book, status='o')
+
+    def assertStatistics(self, **expected):
+        statistics = CatalogStatistics.objects.get(pk=1)
+        for name, value in expected.items():
+            self.assertEqual(getattr(statistics, name), value, name)
+
+    def test_counts_created_objects(self):
+        self.assertStatistics(
+            books=1, copies=2, available_copies=1, authors=1, genres=1)
+
+    def test_counts_status_changes(self):
+        copy = BookInstance.objects.get(status='o')
+        copy.status = 'a'
+        copy.save()
+        self.assertStatistics(copies=2, available_copies=2)
+
+        copy.due_back = None
+        copy.save()
+        self.assertStatistics(available_copies=2)
+
+        copy.status = 'm'
+        copy.save()
+        self.assertStatistics(available_copies=1)
+
+    def test_counts_deleted_objects(self):
+        BookInstance.objects.filter(status='a').delete()
+        self.genre.delete()
+        self.assertStatistics(copies=1, available_copies=0, genres=0)
+
+    def test_rebuild_recounts_after_bulk_updates(self):
+        BookInstance.objects.update(status='a')
+        self.assertStatistics(available_copies=1)
+
+        CatalogStatistics.rebuild()
+        self.assertStatistics(available_copies=2)
+
+    def test_load_reads_a_single_row(self):
+        with self.assertNumQueries(1):
+            statistics = CatalogStatistics.load()
+
+        self.assertEqual(statistics.books, 1)
+
+
+class BookInstanceOverdueTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        book = Book.objects.create(
+            title='Book title', summary='Book summary', isbn='9780261102217')
+
+        today = datetime.date.today()
+        yesterday = today - datetime.timedelta(days=1)
+
+        cls.overdue = BookInstance.objects.create(
+            book=book, status='o', due_back=yesterday)
+        cls.due_today = BookInstance.objects.create(
+            book=book, status='o', due_back=today)
+        cls.undated = BookInstance.objects.create(book=book, status='o')
+        cls.returned = BookInstance.objects.create(
+            book=book, status='a', due_back=yesterday)
+
+    def test_overdue_selects_late_loans_only(self):
+        self.assertEqual(list(BookInstance.objects.overdue()), [self.overdue])
+
+    def test_annotation_agrees_with_property(self):
+        with self.assertNumQueries(1):
+            copies = list(BookInstance.objects.annotate_overdue())
+
+        for copy in copies:
+            self.assertEqual(copy.overdue, copy.is_overdue, copy.pk)
+
+        self.assertEqual(
+            [copy.pk for copy in copies if copy.overdue], [self.overdue.pk])
+
+    def test_overdue_count_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(BookInstance.objects.overdue().count(), 1)
+
+
+class ModificationTrackingTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Sam', last_name='Willson')
+        cls.genre = Genre.objects.create(name='Fantasy')
+        cls.publisher = Publisher.objects.create(name='A wild snow')
+        cls.book = Book.objects.create(
+            title='Book title', summary='Book summary', isbn='194873498',
+            author=cls.author)
+        cls.book.genre.add(cls.genre)
+        cls.copy = BookInstance.objects.create(
+            book=cls.book, imprint=cls.publisher, status='a')
+
+    def versions(self):
+        return [
+            model.objects.values_list('updated_at', flat=True).get(pk=obj.pk)
+            for model, obj in ((Book, self.book), (Author, self.author),
+                               (Genre, self.genre), (Publisher, self.publisher))
+        ]
+
+    def assertTouched(self, before, *touched):
+        after = self.versions()
+        self.assertEqual(
+            [new > old for old, new in zip(before, after)], list(touched))
+
+    def test_copy_change_touches_book_and_publisher(self):
+        before = self.versions()
+        self.copy.status = 'o'
+        self.copy.save()
+        self.assertTouched(before, True, False, False, True)
+
+    def test_book_change_touches_pages_listing_it(self):
+        before = self.versions()
+        self.book.title = 'New title'
+        self.book.save()
+        self.assertTouched(before, True, True, True, True)
+
+    def test_genre_rename_touches_its_books(self):
+        before = self.versions()
+        self.genre.name = 'Fairy tale'
+        self.genre.save()
+        self.assertTouched(before, True, True, True, True)
+
+    def test_removing_a_genre_touches_both_sides(self):
+        before = self.versions()
+        self.book.genre.remove(self.genre)
+        self.assertTouched(before, True, True, True, True)
+
+
+class LoanTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        cls.publisher = Publisher.objects.create(name='A wild snow')
+        cls.book = Book.objects.create(
+            title='Book title', summary='Book summary', isbn='194873498')
+        cls.copies = [
+            BookInstance.objects.create(book=cls.book, imprint=cls.publisher, status=status)
+            for status in ('m', 'a', 'a')
+        ]
+        CatalogStatistics.rebuild()
+
+    def test_any_available_copy_is_lent(self):
+        before = Book.objects.values_list('updated_at', flat=True).get(pk=self.book.pk)
+
+        lent = {loans.lend_any_copy(self.book.pk, self.reader) for _ in range(2)}
+        self.assertEqual(lent, {self.copies[1].pk, self.copies[2].pk})
+
+        copy = BookInstance.objects.get(pk=self.copies[1].pk)
+        self.assertEqual(copy.status, 'o')
+        self.assertEqual(copy.borrower, self.reader)
+        self.assertEqual(copy.due_back, loans.default_due_back())
+
+        self.assertEqual(CatalogStatistics.load().available_copies, 0)
+        self.assertGreater(
+            Book.objects.values_list('updated_at', flat=True).get(pk=self.book.pk), before)
+
+        with self.assertRaises(loans.LoanError):
+            loans.lend_any_copy(self.book.pk, self.reader)
+
+    def test_a_copy_is_lent_once(self):
+        due_back = datetime.date.today() + datetime.timedelta(days=7)
+        loans.lend_copy(self.copies[1].pk, self.reader, due_back)
+        self.assertEqual(BookInstance.objects.get(pk=self.copies[1].pk).due_back, due_back)
+
+        for copy in self.copies[:2]:
+            with self.assertRaises(loans.LoanError):
+                loans.lend_copy(copy.pk, self.reader)
+
+    def test_return(self):
+        loans.lend_copy(self.copies[1].pk, self.reader)
+        loans.return_copy(self.copies[1].pk)
+
+        copy = BookInstance.objects.get(pk=self.copies[1].pk)
+        self.assertEqual((copy.status, copy.borrower, copy.due_back), ('a', None, None))
+        self.assertEqual(CatalogStatistics.load().available_copies, 2)
+
+        with self.assertRaises(loans.LoanError):
+            loans.return_copy(self.copies[1].pk)
@@ -1,14 +1,22 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, views
+
+# Under ASGI the read-only views are served by their async versions
+read_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('', views.index, name="index")
+    path('', read_views.index, name="index")
 ]
 
 urlpatterns += [
-    path('books/', views.BookListView.as_view(), name="books"),
+    path('books/', read_views.BookListView.as_view(), name="books"),
+    path('books/export/', views.export_books, name='books-export'),
+    path('books/exports/', views.book_exports, name='books-exports'),
+    path('books/exports/<str:name>',
+         views.download_book_export, name='books-export-download'),
     path('book/create/', views.BookCreate.as_view(), name='book-create'),
-    path('book/<int:pk>', views.BookDetailView.as_view(), name="book-detail"),
+    path('book/<int:pk>', read_views.BookDetailView.as_view(), name="book-detail"),
     path('book/<int:pk>/update/',
          views.BookUpdate.as_view(), name='book-update'),
     path('book/<int:pk>/delete/',
@@ -16,10 +24,10 @@ urlpatterns += [
 ]
 
 urlpatterns += [
-    path('authors/', views.AuthorListView.as_view(), name='authors'),
+    path('authors/', read_views.AuthorListView.as_view(), name='authors'),
     path('author/create/', views.AuthorCreate.as_view(), name='author-create'),
     path('author/<int:pk>',
-         views.AuthorDetailView.as_view(), name='author-detail'),
+         read_views.AuthorDetailView.as_view(), name='author-detail'),
     path('author/<int:pk>/update/',
          views.AuthorUpdate.as_view(), name='author-update'),
     path('author/<int:pk>/delete/',
@@ -29,9 +37,9 @@ urlpatterns += [
 
 urlpatterns += [
     path('genres/',
-         views.GenreListView.as_view(), name='genres'),
+         read_views.GenreListView.as_view(), name='genres'),
     path('genre/<int:pk>',
-         views.GenreDetailView.as_view(), name='genre-detail'),
+         read_views.GenreDetailView.as_view(), name='genre-detail'),
     path('genre/create/',
          views.GenreCreateView.as_view(), name='genre-create'),
     path('genre/<int:pk>/edit',
@@ -43,9 +51,9 @@ urlpatterns += [
 
 urlpatterns += [
     path('publishers/',
-         views.PublisherListView.as_view(), name='publishers'),
+         read_views.PublisherListView.as_view(), name='publishers'),
     path('publisher/<int:pk>',
-         views.PublisherDetailView.as_view(), name='publisher-detail'),
+         read_views.PublisherDetailView.as_view(), name='publisher-detail'),
     path('publisher/create/',
          views.PublisherCreateView.as_view(), name='publisher-create'),
     path('publisher/<int:pk>/edit',
@@ -58,6 +66,26 @@ urlpatterns += [
 urlpatterns += [
     path('book/<uuid:pk>/renew/', views.renew_book_librarian,
          name='renew-book-librarian'),
+    path('book/<int:pk>/checkout/', views.checkout_book_librarian,
+         name='checkout-book-librarian'),
+    path('book/<uuid:pk>/return/', views.return_book_librarian,
+         name='return-book-librarian'),
     path('mybooks/', views.LoanedBooksByUser.as_view(), name="my-borrowed"),
     path('borrowed/', views.BorrowedBooksForLibrarian.as_view(), name="borrowed"),
 ]
+
+
+urlpatterns += [
+    path('api/books/', api.BookResource.as_view(), name='api-books'),
+    path('api/books/lookup/', api.BookLookup.as_view(), name='api-books-lookup'),
+    path('api/books/<int:pk>/', api.BookResource.as_view(), name='api-book'),
+    path('api/authors/', api.AuthorResource.as_view(), name='api-authors'),
+    path('api/authors/<int:pk>/', api.AuthorResource.as_view(), name='api-author'),
+    path('api/genres/', api.GenreResource.as_view(), name='api-genres'),
+    path('api/genres/<int:pk>/', api.GenreResource.as_view(), name='api-genre'),
+    path('api/publishers/', api.PublisherResource.as_view(), name='api-publishers'),
+    path('api/publishers/<int:pk>/', api.PublisherResource.as_view(), name='api-publisher'),
+    path('api/copies/', api.CopyResource.as_view(), name='api-copies'),
+    path('api/copies/lookup/', api.CopyLookup.as_view(), name='api-copies-lookup'),
+    path('api/copies/<uuid:pk>/', api.CopyResource.as_view(), name='api-copy'),
+]
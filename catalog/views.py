@@ -1,82 +1,180 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponseRedirect
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse, Http404
 from django.urls import reverse
 from django.views import generic
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required, permission_required
+from django.core.files.storage import default_storage
+from django.views.decorators.http import require_POST
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
+from django.views.generic.detail import SingleObjectMixin
 from django.urls import reverse_lazy
 
 import datetime
 
-from .models import Book, BookInstance, Author, Genre, Publisher
-from catalog.forms import RenewBookForm
+from .models import Book, BookInstance, Author, Genre, Publisher, CatalogStatistics
+from catalog.forms import CheckoutForm, RenewBookForm
 
-from .filters import BookFilter
+from . import loans, visits
+from . import export
+from .export import CONTENT_TYPES, ExportStream
+from .filters import BookFilter, LoanFilter
+from .conditional import ConditionalGetMixin, start_of_today
+from .pagination import CursorPaginationMixin, EstimatedCountPaginator
 
 
 def index(request):
 
-    total_number_of_books = Book.objects.count()
-    total_number_of_book_instance = Book.objects.count()
+    # Counted in a signed cookie and in memory, no session or row is written
+    number_of_visits = visits.read_visits(request) + 1
+    visits.counter.add()
 
-    total_number_of_available_books = BookInstance.objects.filter(
-        status__exact='a').count()
-
-    total_number_of_authors = Author.objects.count()
-
-    total_number_of_genre = Genre.objects.filter(name__contains='sci').count()
-
-    number_of_visits = request.session.get('number_of_visits', 1)
-    request.session['number_of_visits'] = number_of_visits + 1
+    statistics = CatalogStatistics.load()
 
     context = {
-        'total_number_of_books': total_number_of_books,
-        'total_number_of_book_instance': total_number_of_books,
-        'total_number_of_available_books': total_number_of_books,
-        'total_number_of_authors': total_number_of_books,
-        'total_number_of_genre': total_number_of_genre,
+        'total_number_of_books': statistics.books,
+        'total_number_of_book_instance': statistics.copies,
+        'total_number_of_available_books': statistics.available_copies,
+        'total_number_of_authors': statistics.authors,
+        'total_number_of_genre': statistics.genres,
+        'total_number_of_visits': statistics.visits + visits.counter.pending,
         'number_of_visits': number_of_visits
     }
 
-    return render(request, 'index.html', context=context)
+    response = render(request, 'index.html', context=context)
+    visits.remember_visits(response, number_of_visits)
+
+    return response
+
+
+# Catalog browsing reads from a replica, see ReplicaRoutingMiddleware
+index.use_replica = True
 
 
-class BookListView(generic.ListView):
+class BookListView(CursorPaginationMixin, generic.ListView):
     model = Book
     paginate_by = 10
+    paginator_class = EstimatedCountPaginator
+    use_replica = True
+
+    def get_queryset(self):
+        queryset = Book.objects.select_related(
+            'author').order_by('title', 'pk')
+
+        self.filter = BookFilter(self.request.GET, queryset=queryset)
+        return self.filter.qs
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['filter'] = BookFilter(
-            self.request.GET, queryset=self.get_queryset())
+        context['filter'] = self.filter
         return context
 
 
-class BookDetailView(generic.DetailView):
+class BookDetailView(ConditionalGetMixin, generic.DetailView):
     model = Book
+    use_replica = True
+
+    def get_queryset(self):
+        return Book.objects.select_related('author', 'language')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Lazy, only read when the cached fragment is missing
+        context['copies'] = self.object.bookinstance_set.select_related('imprint')
+        return context
+
+
+@login_required
+@permission_required('catalog.view_book', raise_exception=True)
+def export_books(request):
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in CONTENT_TYPES:
+        raise Http404('Unknown export format')
+
+    stream = ExportStream(export_format)
+    response = StreamingHttpResponse(stream, content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="books.{export_format}"'
+    # Sent by localLibrary.handlers.ASGIHandler, off the event loop
+    response.async_streaming_content = stream
+
+    return response
+
 
+@staff_member_required
+def book_exports(request):
+    """Start background exports and list the saved ones, so large exports
+        do not hold a worker for the length of the download"""
 
-class AuthorListView(generic.ListView):
+    if request.method == 'POST':
+        export_format = request.POST.get('format', 'csv')
+        if export_format not in CONTENT_TYPES:
+            raise Http404('Unknown export format')
+
+        export.start_export(export_format)
+        return HttpResponseRedirect(reverse('books-exports'))
+
+    context = {
+        'formats': sorted(CONTENT_TYPES),
+        'running_exports': sorted(
+            (name.split('/')[-1] for name in export.running_exports()), reverse=True),
+        'saved_exports': export.saved_exports(),
+    }
+
+    return render(request, 'catalog/book_exports.html', context)
+
+
+@staff_member_required
+def download_book_export(request, name):
+    path = '%s/%s' % (export.EXPORT_DIR, name)
+    if not default_storage.exists(path):
+        raise Http404('No such export')
+
+    return FileResponse(default_storage.open(path, 'rb'), as_attachment=True, filename=name)
+
+
+class AuthorListView(CursorPaginationMixin, generic.ListView):
     model = Author
     paginate_by = 10
+    paginator_class = EstimatedCountPaginator
+    use_replica = True
 
 
-class AuthorDetailView(generic.DetailView):
-    model = Author
+class AuthorDetailView(ConditionalGetMixin, SingleObjectMixin, generic.ListView):
+    template_name = 'catalog/author_detail.html'
+    paginate_by = 10
+    conditional_model = Author
+    use_replica = True
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object(queryset=Author.objects.all())
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        return self.object.book_set.select_related('language').prefetch_related(
+            'genre'
+        ).only(
+            'title', 'summary', 'isbn', 'author', 'language', 'language__name'
+        ).order_by('title', 'pk')
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['book_list'] = context['object_list']
+        return context
 
-class LoanedBooksByUser(LoginRequiredMixin, generic.ListView):
+
+class LoanedBooksByUser(LoginRequiredMixin, CursorPaginationMixin, generic.ListView):
 
     model = BookInstance
     template_name = 'catalog/bookinstance_list_borrowed_user.html'
     paginate_by = 10
 
     def get_queryset(self):
-        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o').order_by('due_back')
+        return BookInstance.objects.filter(borrower=self.request.user).filter(
+            status__exact='o').select_related('book').annotate_overdue().order_by('due_back')
 
 
-class BorrowedBooksForLibrarian(PermissionRequiredMixin, generic.ListView):
+class BorrowedBooksForLibrarian(PermissionRequiredMixin, CursorPaginationMixin, generic.ListView):
 
     model = BookInstance
     template_name = 'catalog/bookinstance_list_borrowed_librarian.html'
@@ -84,6 +182,22 @@ class BorrowedBooksForLibrarian(PermissionRequiredMixin, generic.ListView):
 
     permission_required = 'catalog.change_bookinstance'
 
+    def get_queryset(self):
+        queryset = BookInstance.objects.filter(status__exact='o').select_related(
+            'book', 'borrower'
+        ).only(
+            'due_back', 'status', 'book', 'book__title', 'borrower',
+            'borrower__username'
+        ).annotate_overdue().order_by('due_back')
+
+        self.filter = LoanFilter(self.request.GET, queryset=queryset)
+        return self.filter.qs
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['filter'] = self.filter
+        return context
+
 
 @login_required
 @permission_required('catalog.change_bookinstance', raise_exception=True)
@@ -115,6 +229,54 @@ def renew_book_librarian(request, pk):
     return render(request, 'catalog/book_renew_librarian.html', context)
 
 
+@login_required
+@permission_required('catalog.change_bookinstance', raise_exception=True)
+def checkout_book_librarian(request, pk):
+    book = get_object_or_404(Book, pk=pk)
+    status = 200
+
+    if request.method == 'POST':
+
+        form = CheckoutForm(request.POST)
+
+        if form.is_valid():
+
+            try:
+                loans.lend_any_copy(
+                    book.pk, form.cleaned_data['borrower'], form.cleaned_data['due_back'])
+            except loans.LoanError as e:
+                form.add_error(None, str(e))
+                status = 409
+            else:
+                return HttpResponseRedirect(reverse('borrowed'))
+
+    else:
+
+        form = CheckoutForm(initial={'due_back': loans.default_due_back()})
+
+    context = {
+        'form': form,
+        'book': book,
+        'available_copies': book.bookinstance_set.filter(status__exact='a').count(),
+    }
+
+    return render(request, 'catalog/book_checkout_librarian.html', context, status=status)
+
+
+@login_required
+@permission_required('catalog.can_mark_returned', raise_exception=True)
+@require_POST
+def return_book_librarian(request, pk):
+    try:
+        loans.return_copy(pk)
+    except BookInstance.DoesNotExist:
+        raise Http404('No such copy')
+    except loans.LoanError as e:
+        return HttpResponse(str(e), status=409, content_type='text/plain')
+
+    return HttpResponseRedirect(reverse('borrowed'))
+
+
 class AuthorCreate(PermissionRequiredMixin, CreateView):
 
     permission_required = 'catalog.add_author'
@@ -162,13 +324,32 @@ class BookDelete(LoginRequiredMixin, PermissionRequiredMixin, DeleteView):
     permission_required = 'catalog.delete_book'
 
 
-class GenreListView(generic.ListView):
+class GenreListView(CursorPaginationMixin, generic.ListView):
     model = Genre
     paginate_by = 10
+    use_replica = True
 
 
-class GenreDetailView(generic.DetailView):
-    model = Genre
+class GenreDetailView(ConditionalGetMixin, SingleObjectMixin, generic.ListView):
+    template_name = 'catalog/genre_detail.html'
+    paginate_by = 10
+    conditional_model = Genre
+    use_replica = True
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object(queryset=Genre.objects.all())
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        return self.object.book_set.select_related('author', 'language').only(
+            'title', 'summary', 'isbn', 'author', 'author__first_name',
+            'author__last_name', 'language', 'language__name'
+        ).order_by('title', 'pk')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['book_list'] = context['object_list']
+        return context
 
 
 class GenreCreateView(LoginRequiredMixin, PermissionRequiredMixin, generic.CreateView):
@@ -197,13 +378,27 @@ class GenreDeleteView(LoginRequiredMixin, PermissionRequiredMixin, generic.Delet
     success_url = reverse_lazy('genres')
 
 
-class PublisherListView(generic.ListView):
+class PublisherListView(CursorPaginationMixin, generic.ListView):
     model = Publisher
     paginate_by = 10
+    ordering = ['name']
+    use_replica = True
 
 
-class PublisherDetailView(generic.DetailView):
+class PublisherDetailView(ConditionalGetMixin, generic.DetailView):
     model = Publisher
+    use_replica = True
+
+    def get_last_modified(self):
+        # Copies turn overdue at midnight without any write
+        last_modified = super().get_last_modified()
+        return last_modified and max(last_modified, start_of_today())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['bookinstance_list'] = self.object.bookinstance_set.select_related(
+            'book', 'borrower').annotate_overdue()
+        return context
 
 
 class PublisherCreateView(LoginRequiredMixin, PermissionRequiredMixin, generic.CreateView):
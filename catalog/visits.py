@@ -0,0 +1,63 @@
+import threading
+import time
+
+from django.conf import settings
+
+from .models import CatalogStatistics
+
+COOKIE_NAME = 'number_of_visits'
+COOKIE_SALT = 'catalog.visits'
+COOKIE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def read_visits(request):
+    """Number of earlier visits recorded in the visitor's signed cookie"""
+
+    value = request.get_signed_cookie(COOKIE_NAME, default=0, salt=COOKIE_SALT)
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        return 0
+
+
+def remember_visits(response, number_of_visits):
+    response.set_signed_cookie(
+        COOKIE_NAME, number_of_visits, salt=COOKIE_SALT,
+        max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax')
+
+
+class VisitCounter:
+    """Visits counted in process memory and added to
+        CatalogStatistics.visits in batches.
+
+        A batch is written once VISIT_FLUSH_SIZE visits are pending or
+        VISIT_FLUSH_INTERVAL seconds after the last write, so most visits
+        cost no database write. Visits still pending when a worker stops
+        are lost, the total is a traffic indicator, not an audit log"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.flushed_at = time.monotonic()
+
+    def add(self, count=1):
+        with self.lock:
+            self.pending += count
+            due = (
+                self.pending >= settings.VISIT_FLUSH_SIZE
+                or time.monotonic() - self.flushed_at >= settings.VISIT_FLUSH_INTERVAL
+            )
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, 0
+            self.flushed_at = time.monotonic()
+
+        if pending:
+            CatalogStatistics.adjust(visits=pending)
+
+
+counter = VisitCounter()
@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'localLibrary.settings')
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+# Imported once django is set up, the handler loads the middleware
+from localLibrary.handlers import ASGIHandler  # noqa: E402
+
+application = ASGIHandler()
@@ -0,0 +1,39 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers import asgi
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    """ASGIHandler sending the body of responses carrying an
+        ``async_streaming_content`` with ``async for``, as django 4.2 does.
+
+        Django 3.2 iterates streaming responses on the event loop, where
+        content reading the database raises SynchronousOnlyOperation"""
+
+    async def send_response(self, response, send):
+        content = getattr(response, 'async_streaming_content', None)
+        if content is None:
+            return await super().send_response(response, send)
+
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            response_headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            response_headers.append(
+                (b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers,
+        })
+
+        async for part in content:
+            for chunk, _ in self.chunk_bytes(response.make_bytes(part)):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
@@ -0,0 +1,244 @@
+import asyncio
+import contextvars
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import pooling  # noqa: F401, connects the connection upkeep receivers
+from .routers import replica_reads
+
+logger = logging.getLogger('localLibrary.queries')
+
+# QueryStats of the request being served. Context variables follow the
+# request into the threads running its sync code under ASGI
+current_stats = contextvars.ContextVar('current_stats', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryStats:
+    """Execute wrapper counting and timing the statements of a request"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest_sql = None
+        self.slowest_duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+
+            if self.slowest_sql is None or duration > self.slowest_duration:
+                self.slowest_sql = sql
+                self.slowest_duration = duration
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper of every connection, adding the statement to the
+        stats of the current request if any"""
+
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    return stats(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+def mark_async(middleware):
+    """Have django await ``middleware`` when the rest of the chain is async,
+        as MiddlewareMixin does"""
+
+    if asyncio.iscoroutinefunction(middleware.get_response):
+        middleware._is_coroutine = asyncio.coroutines._is_coroutine
+        return True
+
+    return False
+
+
+class QueryStatsMiddleware:
+    """Record query count, total DB time and the slowest statement of each
+        request, log them and check them against ``QUERY_BUDGETS``.
+
+        Budgets are keyed by URL name. Going over budget is logged as a
+        warning, or raises QueryBudgetExceeded when ``QUERY_BUDGET_ENFORCE``
+        is set, as it is under the test runner"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = mark_async(self)
+
+        # Connections opened from now on get the wrapper when they connect
+        for connection in connections.all():
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        stats = QueryStats()
+        token = current_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+
+        return self.check(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        token = current_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+
+        return self.check(request, response, stats)
+
+    def check(self, request, response, stats):
+        url_name = getattr(request.resolver_match, 'url_name', None)
+
+        logger.info(
+            '%s %s (%s): %d queries in %.1fms, slowest %.1fms: %s',
+            request.method, request.path, url_name, stats.count,
+            stats.duration * 1000, stats.slowest_duration * 1000,
+            stats.slowest_sql)
+
+        if getattr(settings, 'QUERY_STATS_HEADERS', False):
+            response['X-DB-Query-Count'] = str(stats.count)
+            response['X-DB-Query-Time'] = '%.1fms' % (stats.duration * 1000)
+            response['X-DB-Slowest-Query-Time'] = '%.1fms' % (
+                stats.slowest_duration * 1000)
+
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(url_name)
+        if budget is not None and stats.count > budget:
+            message = '%s %s (%s) ran %d queries, over its budget of %d' % (
+                request.method, request.path, url_name, stats.count, budget)
+
+            if getattr(settings, 'QUERY_BUDGET_ENFORCE', False):
+                raise QueryBudgetExceeded(message)
+
+            logger.warning(message)
+
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Let the views marked ``use_replica`` read from a replica.
+
+        Only GET and HEAD requests qualify, along with the methods a view
+        lists in ``read_only_methods``. Any other successful request
+        sets a short lived cookie, and requests carrying it stay on the
+        primary so the user sees their own writes, as on the redirect after
+        renewing a book, however far the replicas lag"""
+
+    cookie_name = 'use_primary'
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = mark_async(self)
+
+        if self.is_async:
+            # Route on the event loop, in the context of the request
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        try:
+            response = self.get_response(request)
+        finally:
+            self.reset(request)
+
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.reset(request)
+
+        return self.pin(request, response)
+
+    def reset(self, request):
+        token = getattr(request, '_replica_reads_token', None)
+        if token is not None:
+            replica_reads.reset(token)
+
+    def pin(self, request, response):
+        if (settings.DATABASE_REPLICAS and response.status_code < 400
+                and request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+                and not getattr(request, '_read_only', False)):
+            response.set_cookie(
+                self.cookie_name, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax')
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.route(request, view_func)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self.route(request, view_func)
+
+    def route(self, request, view_func):
+        view = getattr(view_func, 'view_class', view_func)
+        request._read_only = request.method in getattr(view, 'read_only_methods', ())
+
+        if (getattr(view, 'use_replica', False)
+                and (request.method in ('GET', 'HEAD') or request._read_only)
+                and self.cookie_name not in request.COOKIES):
+            request._replica_reads_token = replica_reads.set(True)
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise, which django_heroku puts first, usable in an async
+        middleware chain, where the sync only original would run every
+        request in a thread. Finding a static file is a dict lookup, or a
+        few stat calls with autorefresh in development"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.is_async = mark_async(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        response = self.process_request(request)
+        if response is None:
+            response = await self.get_response(request)
+
+        return response
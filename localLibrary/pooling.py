@@ -0,0 +1,102 @@
+"""Upkeep and statistics of the persistent database connections of a worker.
+
+Every thread keeps its own connection per database for CONN_MAX_AGE
+seconds. Before a request reuses one, it is closed when it sat idle for
+longer than DATABASE_CONN_MAX_IDLE seconds, or when it fails a health
+check, so the request opens a fresh one instead of failing on a
+connection the server or a pooler dropped.
+"""
+import collections
+import os
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+EVENTS = ('opened', 'reused', 'recycled_idle', 'recycled_unusable')
+
+counters = collections.defaultdict(collections.Counter)
+lock = threading.Lock()
+
+# Connection wrappers of every thread, to report the open ones
+wrappers = weakref.WeakSet()
+
+
+def count(alias, event):
+    with lock:
+        counters[alias][event] += 1
+
+
+def connection_opened(sender, connection, **kwargs):
+    connection.opened_at = connection.last_used = time.monotonic()
+    count(connection.alias, 'opened')
+
+    with lock:
+        wrappers.add(connection)
+
+
+def check_connections(**kwargs):
+    """Close the idle or broken connections of the current thread"""
+
+    now = time.monotonic()
+    max_idle = settings.DATABASE_CONN_MAX_IDLE
+
+    for connection in connections.all():
+        # Connections in a transaction are left alone, as by django
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+
+        if max_idle and now - getattr(connection, 'last_used', now) > max_idle:
+            count(connection.alias, 'recycled_idle')
+            connection.close()
+        elif settings.DATABASE_CONN_HEALTH_CHECKS and not connection.is_usable():
+            count(connection.alias, 'recycled_unusable')
+            connection.close()
+        else:
+            count(connection.alias, 'reused')
+
+
+def touch_connections(**kwargs):
+    now = time.monotonic()
+
+    for connection in connections.all():
+        if connection.connection is not None:
+            connection.last_used = now
+
+
+def pool_stats():
+    """Connection counts of this worker process, by database"""
+
+    now = time.monotonic()
+    with lock:
+        open_connections = [
+            connection for connection in wrappers if connection.connection is not None]
+        snapshot = {alias: dict(events) for alias, events in counters.items()}
+
+    databases = {}
+    for alias in connections:
+        ages = [now - connection.opened_at for connection in open_connections
+                if connection.alias == alias]
+        databases[alias] = {
+            'conn_max_age': connections.databases[alias]['CONN_MAX_AGE'],
+            'open': len(ages),
+            'oldest_seconds': round(max(ages), 1) if ages else None,
+            **{event: snapshot.get(alias, {}).get(event, 0) for event in EVENTS},
+        }
+
+    return {
+        'pid': os.getpid(),
+        'threads': threading.active_count(),
+        'max_idle_seconds': settings.DATABASE_CONN_MAX_IDLE,
+        'health_checks': settings.DATABASE_CONN_HEALTH_CHECKS,
+        'databases': databases,
+    }
+
+
+connection_created.connect(connection_opened)
+request_started.connect(check_connections)
+request_finished.connect(touch_connections)
@@ -0,0 +1,32 @@
+import contextvars
+import random
+
+from django.conf import settings
+
+# Set by ReplicaRoutingMiddleware for the requests allowed to read from a
+# replica. Everything else, management commands included, uses the primary
+replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+# Sessions and users are read right after they are written, at login
+PRIMARY_APPS = {'admin', 'auth', 'contenttypes', 'sessions'}
+
+
+class ReplicaRouter:
+    """Send the reads of replica enabled requests to one of the databases
+        named in ``DATABASE_REPLICAS``, and every write to ``default``"""
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+
+        if (not replicas or not replica_reads.get()
+                or model._meta.app_label in PRIMARY_APPS):
+            return 'default'
+
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 
 from pathlib import Path
 import django_heroku
+import dj_database_url
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -40,9 +41,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django_filters',
 ]
 
 MIDDLEWARE = [
+    'localLibrary.middleware.QueryStatsMiddleware',
+    'localLibrary.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -122,7 +126,185 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Uploaded and generated files, such as the background catalog exports.
+# Set DEFAULT_FILE_STORAGE to keep them off the local disk
+
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', BASE_DIR / 'media')
+
+# Cache
+# Local memory by default. Point CACHE_BACKEND and CACHE_LOCATION at a
+# file, memcached or Redis (django-redis) cache to share it between workers
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+        'TIMEOUT': int(os.environ.get('CACHE_TIMEOUT', 300)),
+    }
+}
+
+# Home page visits are added to the catalog statistics in batches of
+# VISIT_FLUSH_SIZE, or every VISIT_FLUSH_INTERVAL seconds
+
+VISIT_FLUSH_SIZE = int(os.environ.get('VISIT_FLUSH_SIZE', 100))
+
+VISIT_FLUSH_INTERVAL = int(os.environ.get('VISIT_FLUSH_INTERVAL', 60))
+
+# Email
+# Sent over SMTP. Set EMAIL_BACKEND to
+# django.core.mail.backends.console.EmailBackend to print overdue notices
+# in development instead; the test runner keeps them in memory
+
+EMAIL_BACKEND = os.environ.get(
+    'EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'False') == 'True'
+
+DEFAULT_FROM_EMAIL = os.environ.get(
+    'DEFAULT_FROM_EMAIL', 'LocalLibrary <library@localhost>')
+
+# Query instrumentation
+# Requests going over the number of queries budgeted for their URL name
+# are logged, and fail the test suite. Budgets include the session, user
+# and permission lookups of a logged in librarian
+
+QUERY_BUDGETS = {
+    'index': 5,
+    'books': 8,
+    'book-detail': 8,
+    'authors': 6,
+    'author-detail': 9,
+    'author-create': 17,
+    'genres': 6,
+    'genre-detail': 8,
+    'genre-create': 17,
+    'publishers': 6,
+    'publisher-detail': 7,
+    'publisher-create': 5,
+    'my-borrowed': 6,
+    'borrowed': 6,
+    'renew-book-librarian': 9,
+    'checkout-book-librarian': 11,
+    'return-book-librarian': 9,
+    'api-books': 2,
+    'api-book': 2,
+    'api-authors': 1,
+    'api-author': 1,
+    'api-genres': 1,
+    'api-genre': 1,
+    'api-publishers': 1,
+    'api-publisher': 1,
+    'api-copies': 1,
+    'api-copy': 1,
+    # One query per API_LOOKUP_CHUNK_SIZE keys
+    'api-books-lookup': 10,
+    'api-copies-lookup': 10,
+    'db-pool-stats': 2,
+    'books-exports': 4,
+    'books-export-download': 2,
+}
+
+QUERY_BUDGET_ENFORCE = False
+
+QUERY_STATS_HEADERS = os.environ.get('QUERY_STATS_HEADERS', str(DEBUG)) == 'True'
+
+# Paginators of large list views estimate the number of rows of whole
+# tables larger than this instead of counting them on every page
+
+PAGINATOR_ESTIMATE_THRESHOLD = int(
+    os.environ.get('PAGINATOR_ESTIMATE_THRESHOLD', 10000))
+
+PAGINATOR_COUNT_CACHE_TIMEOUT = 300
+
+# Batch lookups of the API accept up to API_LOOKUP_MAX_KEYS ISBNs or copy
+# ids, read API_LOOKUP_CHUNK_SIZE at a time
+
+API_LOOKUP_MAX_KEYS = int(os.environ.get('API_LOOKUP_MAX_KEYS', 5000))
+
+API_LOOKUP_CHUNK_SIZE = 500
+
 # Activate Django-Heroku.
 django_heroku.settings(locals())
 
+# Set after django_heroku, which swaps in its own runner when CI is set. It
+# reuses the PostgreSQL database Heroku CI provides in DATABASE_URL
+if 'CI' in os.environ and 'DATABASE_URL' in os.environ:
+    TEST_RUNNER = 'localLibrary.test_runner.HerokuQueryBudgetTestRunner'
+else:
+    TEST_RUNNER = 'localLibrary.test_runner.QueryBudgetTestRunner'
+
 LOGIN_REDIRECT_URL = '/'
+
+# Read replicas
+# Comma separated database URLs in DATABASE_REPLICA_URLS serve the reads of
+# the catalog browsing views. Without them, a second SQLite file is set up
+# as the 'replica' alias: copy db.sqlite3 over it and set
+# DATABASE_REPLICAS=replica to try the routing locally
+
+DATABASE_REPLICAS = []
+
+for number, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(','))):
+    DATABASES[f'replica_{number}'] = dj_database_url.parse(url.strip())
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+if not DATABASE_REPLICAS:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.replica.sqlite3',
+    }
+    DATABASE_REPLICAS = list(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')))
+
+DATABASE_ROUTERS = ['localLibrary.routers.ReplicaRouter']
+
+# Database connections
+# Each worker thread keeps its connections open for DATABASE_CONN_MAX_AGE
+# seconds, 0 closes them after every request. Before a request reuses a
+# connection, it is closed when idle for over DATABASE_CONN_MAX_IDLE
+# seconds or, with health checks, when it no longer answers, see
+# localLibrary.pooling. Set DATABASE_POOLER=transaction behind a pooler in
+# transaction mode such as PgBouncer, where a session's server connection
+# changes between transactions and server side cursors cannot be kept
+
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 600))
+
+DATABASE_CONN_MAX_IDLE = int(os.environ.get('DATABASE_CONN_MAX_IDLE', 300))
+
+DATABASE_CONN_HEALTH_CHECKS = os.environ.get('DATABASE_CONN_HEALTH_CHECKS', 'True') == 'True'
+
+DATABASE_POOLER = os.environ.get('DATABASE_POOLER', '')
+
+for database in DATABASES.values():
+    database['CONN_MAX_AGE'] = DATABASE_CONN_MAX_AGE
+
+    if DATABASE_POOLER == 'transaction' and 'postgresql' in database['ENGINE']:
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Seconds the requests following a write stay on the primary
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
+
+LOGGING['loggers']['localLibrary.queries'] = {
+    'handlers': ['console'],
+    'level': os.environ.get('QUERY_LOG_LEVEL', 'WARNING'),
+}
+
+# ASGI
+# localLibrary.asgi turns ASYNC_VIEWS on, serving the read-only catalog
+# views asynchronously (see the README). WhiteNoise's sync only middleware,
+# added by django_heroku, is swapped for one keeping the chain async
+
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'False') == 'True'
+
+MIDDLEWARE = [
+    'localLibrary.middleware.AsyncWhiteNoiseMiddleware'
+    if name == 'whitenoise.middleware.WhiteNoiseMiddleware' else name
+    for name in MIDDLEWARE
+]
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django_heroku import HerokuDiscoverRunner
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """Fail the requests of the test suite that go over their query budget"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_ENFORCE = True
+
+
+class HerokuQueryBudgetTestRunner(QueryBudgetTestRunner, HerokuDiscoverRunner):
+    """QueryBudgetTestRunner on the database Heroku CI provides"""
@@ -18,9 +18,10 @@ from django.urls import path, include
 from django.views.generic import RedirectView
 from django.conf import settings
 from django.conf.urls.static import static
-from .views import sign_up_user
+from .views import database_pool_stats, sign_up_user
 
 urlpatterns = [
+    path('admin/db-pool/', database_pool_stats, name='db-pool-stats'),
     path('admin/', admin.site.urls),
 ]
 
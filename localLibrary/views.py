@@ -1,9 +1,11 @@
 from django.views.generic.edit import CreateView
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.shortcuts import render
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, JsonResponse
 from .forms import CustomSignupForm
+from .pooling import pool_stats
 
 
 def sign_up_user(request):
@@ -35,3 +37,11 @@ def sign_up_user(request):
     }
 
     return render(request, 'registration/sign_up_user.html', context)
+
+
+@staff_member_required
+def database_pool_stats(request):
+    """Connections of the worker process answering, to size the number of
+        workers and threads against the database's max_connections"""
+
+    return JsonResponse(pool_stats())